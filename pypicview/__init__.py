@@ -24,7 +24,4 @@ Changes :
 |   along with this program.  If not, see <http://www.gnu.org/licenses/>.  |
 ...........................................................................
 """
-#TODO : 
-#      Convert to grayscale in photo grid 
-
 __version__ = '1.2.1'
@@ -0,0 +1,78 @@
+import os
+from bisect import bisect_left
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer
+
+
+def sortKey(filename):
+    return (filename.lower(), filename)
+
+
+class DirectoryIndex(QObject):
+    ''' Sorted list of image files of a directory, with O(1) position lookup.
+        It is updated incrementally when QFileSystemWatcher reports a change,
+        instead of sorting the whole directory again.'''
+    def __init__(self, parent, extensions):
+        QObject.__init__(self, parent)
+        self.extensions = tuple(extensions)     # lowercase, e.g. '.jpg'
+        self.dirpath = ''
+        self.files = []         # filenames sorted by sortKey()
+        self.positions = {}     # filename -> index in self.files
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.onDirectoryChanged)
+        self.update_timer = QTimer(self)    # Coalesce bursts of change notifications
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(200)
+        self.update_timer.timeout.connect(self.update)
+
+    def setDirectory(self, dirpath):
+        if dirpath == self.dirpath : return
+        if self.dirpath:
+            self.watcher.removePath(self.dirpath)
+        self.dirpath = dirpath
+        self.files = sorted(self.listImages(), key=sortKey)
+        self.positions = {}
+        if dirpath:
+            self.watcher.addPath(dirpath)
+
+    def listImages(self):
+        try:
+            with os.scandir(self.dirpath) as entries:
+                return [entry.name for entry in entries
+                        if entry.name.lower().endswith(self.extensions) and entry.is_file()]
+        except OSError:
+            return []
+
+    def indexOf(self, filename):
+        ''' Returns position of filename, or -1 if it is not in the directory '''
+        if not self.positions and self.files:   # Rebuilt lazily after changes
+            self.positions = {name: i for i, name in enumerate(self.files)}
+        return self.positions.get(filename, -1)
+
+    def neighbour(self, filename, step):
+        ''' Returns the filename step positions away from filename, wrapping around '''
+        index = self.indexOf(filename)
+        if index == -1 : return None
+        return self.files[(index + step) % len(self.files)]
+
+    def count(self):
+        return len(self.files)
+
+    def onDirectoryChanged(self, dirpath):
+        self.update_timer.start()
+
+    def update(self):
+        ''' Insert new files at their sorted position and remove deleted ones '''
+        if not self.dirpath : return
+        current = set(self.listImages())
+        known = set(self.files)
+        removed, added = known - current, current - known
+        if not (removed or added) : return
+        if removed:
+            self.files = [name for name in self.files if name not in removed]
+        keys = [sortKey(name) for name in self.files]
+        for name in sorted(added, key=sortKey):
+            index = bisect_left(keys, sortKey(name))
+            self.files.insert(index, name)
+            keys.insert(index, sortKey(name))
+        self.positions = {}
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QRectF, QSize
+from PyQt5.QtGui import QPixmap, QPainter, QPen, QTransform
+
+
+class EditList:
+    ''' Edits done on an image, recorded as operations instead of being applied.
+        Each operation is in full resolution coordinates of the image produced by
+        the operations before it. Supported operations are
+            ('rotate', degree)  degree is multiple of 90
+            ('crop', QRect)
+            ('resize', QSize)
+            ('border', width)
+        All of them are rendered together in a single pass by render().
+        Only the first self.position operations are applied, the rest are undone
+        operations which can be redone '''
+    def __init__(self, size):
+        self.source_size = QSize(size)      # Size of original image at full resolution
+        self.ops = []
+        self.position = 0
+
+    def append(self, op):
+        del self.ops[self.position:]       # Undone operations can not be redone any more
+        self.ops.append(op)
+        self.position = len(self.ops)
+
+    def applied(self):
+        return self.ops[:self.position]
+
+    def isEmpty(self):
+        return self.position == 0
+
+    def canUndo(self):
+        return self.position > 0
+
+    def canRedo(self):
+        return self.position < len(self.ops)
+
+    def undo(self):
+        if self.canUndo() : self.position -= 1
+
+    def redo(self):
+        if self.canRedo() : self.position += 1
+
+    def size(self):
+        ''' Size of the edited image at full resolution '''
+        return self.geometry()[0]
+
+    def geometry(self, ops=None):
+        ''' Returns size of the result, the transform which maps original image to result,
+            and list of (transform, size) of the image at each border operation '''
+        ops = self.applied() if ops is None else ops
+        size = QSize(self.source_size)
+        transform = QTransform()
+        borders = []
+        for op in ops:
+            if op[0] == 'rotate':
+                rotation = QTransform().rotate(op[1])
+                # trueMatrix keeps rotated image at origin, as QPixmap.transformed() does
+                transform = transform * QPixmap.trueMatrix(rotation, size.width(), size.height())
+                if op[1] % 180 : size.transpose()
+            elif op[0] == 'crop':
+                rect = op[1]
+                transform = transform * QTransform.fromTranslate(-rect.x(), -rect.y())
+                size = rect.size()
+            elif op[0] == 'resize':
+                transform = transform * QTransform.fromScale(op[1].width()/size.width(),
+                                                             op[1].height()/size.height())
+                size = QSize(op[1])
+            elif op[0] == 'border':
+                borders.append((transform, QSize(size), op[1]))
+        return size, transform, borders
+
+    def render(self, source):
+        ''' Apply the operations to source, which is the original image or a reduced copy
+            of it. The result is scaled by the same factor as source. Only the source area
+            which is visible in the result is copied, it is resampled once, and then
+            rotated, which is lossless for multiples of 90 degree.'''
+        if self.isEmpty() : return source
+        size, transform, borders = self.geometry()
+        scale = source.width()/self.source_size.width()
+        out_w, out_h = max(1, round(size.width()*scale)), max(1, round(size.height()*scale))
+        # Maps source pixels to result pixels
+        source_to_out = (QTransform.fromScale(self.source_size.width()/source.width(),
+                                              self.source_size.height()/source.height())
+                         * transform * QTransform.fromScale(out_w/size.width(), out_h/size.height()))
+        rotation = sum(op[1] for op in self.applied() if op[0] == 'rotate') % 360
+        out_to_source = source_to_out.inverted()[0]
+        src_rect = out_to_source.mapRect(QRectF(0, 0, out_w, out_h)).toAlignedRect()
+        pm = source.copy(src_rect.intersected(source.rect()))
+        target = QSize(out_h, out_w) if rotation % 180 else QSize(out_w, out_h)
+        if pm.size() != target:
+            pm = pm.scaled(target, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        if rotation:
+            pm = pm.transformed(QTransform().rotate(rotation))
+        if borders:
+            painter = QPainter(pm)
+            for stage_transform, stage_size, width in borders:
+                # Draw in the coordinates of the image the border was added to
+                painter.setTransform(stage_transform.inverted()[0] * transform
+                                     * QTransform.fromScale(out_w/size.width(), out_h/size.height()))
+                pen = QPen(Qt.black)
+                pen.setWidth(width)
+                pen.setJoinStyle(Qt.MiterJoin)
+                painter.setPen(pen)
+                painter.drawRect(QRectF(width/2, width/2, stage_size.width()-width, stage_size.height()-width))
+            painter.end()
+        return pm
+
+
+class SnapshotCache:
+    ''' Rendered results of an EditList at different positions of its operation log,
+        so that undo and redo do not need to render again. Keyed by (position, scale),
+        where scale is the scale of the source it was rendered from. When memory used
+        exceeds max_bytes, snapshots farthest from the current position are dropped '''
+    def __init__(self, max_bytes=100*1024*1024):
+        self.max_bytes = max_bytes
+        self.snapshots = OrderedDict()
+        self.used_bytes = 0
+
+    def get(self, position, scale):
+        return self.snapshots.get((position, scale))
+
+    def put(self, position, scale, pixmap):
+        self.remove((position, scale))
+        self.snapshots[(position, scale)] = pixmap
+        self.used_bytes += snapshotBytes(pixmap)
+        self.shrink(position)
+
+    def remove(self, key):
+        pixmap = self.snapshots.pop(key, None)
+        if pixmap is not None:
+            self.used_bytes -= snapshotBytes(pixmap)
+
+    def shrink(self, position):
+        ''' Drop snapshots farthest from position till memory used is within budget '''
+        while self.used_bytes > self.max_bytes and self.snapshots:
+            key = max(self.snapshots, key=lambda key: abs(key[0]-position))
+            self.remove(key)
+
+    def setMaxBytes(self, max_bytes, position=0):
+        self.max_bytes = max_bytes
+        self.shrink(position)
+
+    def invalidateAfter(self, position):
+        ''' Drop snapshots of operations which were replaced by a new operation '''
+        for key in [key for key in self.snapshots if key[0] > position]:
+            self.remove(key)
+
+    def clear(self):
+        self.snapshots.clear()
+        self.used_bytes = 0
+
+def snapshotBytes(pixmap):
+    return pixmap.width()*pixmap.height()*pixmap.depth()//8
@@ -0,0 +1,71 @@
+import struct
+
+from PyQt5.QtGui import QImage, QTransform
+
+
+def readExifThumbnail(filepath):
+    ''' Returns the thumbnail embedded in the EXIF data of a JPEG file as QImage,
+        oriented as per EXIF orientation, or None if there is no thumbnail.
+        Only the header segments are read, not the whole file.'''
+    try:
+        with open(filepath, 'rb') as f:
+            if f.read(2) != b'\xff\xd8' : return None       # Not a JPEG file
+            while True:
+                segment = f.read(4)
+                if len(segment) < 4 or segment[0] != 0xFF : return None
+                marker, length = segment[1], struct.unpack('>H', segment[2:])[0]
+                if marker in (0xDA, 0xD9): return None        # Image data starts, no EXIF found
+                if marker == 0xE1:
+                    data = f.read(length-2)
+                    if data.startswith(b'Exif\x00\x00'):
+                        return parseExifThumbnail(data[6:])
+                else:
+                    f.seek(length-2, 1)
+    except (OSError, struct.error):
+        return None
+
+def parseExifThumbnail(tiff):
+    ''' Extract thumbnail from the TIFF structure of EXIF data '''
+    byteorder = {b'II':'<', b'MM':'>'}.get(tiff[:2])
+    if not byteorder : return None
+
+    def readIFD(offset):
+        ''' Returns dict of tag->value for SHORT and LONG tags, and offset of next IFD '''
+        count = struct.unpack_from(byteorder+'H', tiff, offset)[0]
+        tags = {}
+        for i in range(count):
+            entry = offset + 2 + 12*i
+            tag, datatype = struct.unpack_from(byteorder+'HH', tiff, entry)
+            if datatype == 3:   # SHORT
+                tags[tag] = struct.unpack_from(byteorder+'H', tiff, entry+8)[0]
+            elif datatype == 4: # LONG
+                tags[tag] = struct.unpack_from(byteorder+'I', tiff, entry+8)[0]
+        next_ifd = struct.unpack_from(byteorder+'I', tiff, offset + 2 + 12*count)[0]
+        return tags, next_ifd
+
+    try:
+        ifd0, ifd1_offset = readIFD(struct.unpack_from(byteorder+'I', tiff, 4)[0])
+        if not ifd1_offset : return None
+        ifd1, next_ifd = readIFD(ifd1_offset)
+    except struct.error:
+        return None
+    start, length = ifd1.get(0x201), ifd1.get(0x202)   # JPEGInterchangeFormat, ...Length
+    if not start or not length : return None
+    image = QImage.fromData(tiff[start:start+length], 'JPG')
+    if image.isNull() : return None
+    return orientImage(image, ifd0.get(0x112, 1))
+
+def orientImage(image, orientation):
+    ''' Transform QImage as per EXIF orientation value (1-8) '''
+    if orientation == 8:
+        return image.transformed(QTransform().rotate(270))
+    # mirror horizontally, flip vertically, rotate 90
+    mirror, flip, rotate = { 2:(True, False, False), 3:(True, True, False),
+                             4:(False, True, False), 5:(False, True, True),
+                             6:(False, False, True), 7:(True, False, True)
+                           }.get(orientation, (False, False, False))
+    if mirror or flip:
+        image = image.mirrored(mirror, flip)
+    if rotate:
+        image = image.transformed(QTransform().rotate(90))
+    return image
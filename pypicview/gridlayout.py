@@ -0,0 +1,162 @@
+''' Layout of photo boxes on a sheet of paper. Boxes are (x, y, width, height, rotated)
+    in pixels, where rotated is True if the photo is to be placed rotated by 90 degree '''
+
+
+def guillotineLayout(paperW, paperH, W, H, depth=3):
+    ''' Returns boxes of W x H photos which fit on paperW x paperH paper, with as many
+        boxes as possible. Photos may be rotated, then the box is H x W.
+        The paper is cut recursively at multiples of W or H, upto depth times, and each
+        piece is filled by a uniform grid of one orientation. So all boxes can be cut
+        apart by straight cuts through the whole sheet. Only cuts which leave a strip of
+        a few boxes near an edge are tried, as the middle of a large sheet is best
+        filled uniformly, which keeps it fast for any paper size.'''
+    paperW, paperH, W, H = int(paperW), int(paperH), int(W), int(H)
+    if W < 1 or H < 1 : return []
+    memo = {}
+    node = buildNode(paperW, paperH, W, H, depth, memo)
+    boxes = []
+    placeNode(node, 0, 0, paperW, paperH, boxes)
+    return [box + ((box[2], box[3]) != (W, H),) for box in boxes]
+
+def bestCount(w, h, W, H, depth, memo):
+    ''' Returns (count, plan) of best guillotine layout of w x h piece. plan is
+        ('grid', box_w, box_h), ('v', x) for a vertical cut at x, or ('h', y) '''
+    key = (w, h, depth)
+    if key in memo : return memo[key]
+    best = ((w//W)*(h//H), ('grid', W, H))
+    if (w//H)*(h//W) > best[0]:
+        best = ((w//H)*(h//W), ('grid', H, W))
+    if depth > 0 and best[0] < (w*h)//(W*H):     # Not yet the area bound
+        for size, direction in ((w, 'v'), (h, 'h')):
+            for cut in cutPositions(size, W, H):
+                if direction == 'v':
+                    count = (bestCount(cut, h, W, H, depth-1, memo)[0]
+                             + bestCount(w-cut, h, W, H, depth-1, memo)[0])
+                else:
+                    count = (bestCount(w, cut, W, H, depth-1, memo)[0]
+                             + bestCount(w, h-cut, W, H, depth-1, memo)[0])
+                if count > best[0]:
+                    best = (count, (direction, cut))
+    memo[key] = best
+    return best
+
+def cutPositions(size, W, H, count=3):
+    ''' Returns positions of cuts which leave upto count rows or columns of boxes on
+        either side of a piece '''
+    cuts = set()
+    for step in (W, H):
+        n = (size-1)//step      # Number of multiples of step inside the piece
+        cuts.update(step*i for i in range(1, min(n, count)+1))
+        cuts.update(step*i for i in range(max(1, n-count+1), n+1))
+    return sorted(cuts)
+
+def buildNode(w, h, W, H, depth, memo):
+    ''' Returns layout tree of w x h piece. A node is ('grid', cols, rows, box_w, box_h),
+        or ('v', left, right) or ('h', top, bottom) '''
+    count, plan = bestCount(w, h, W, H, depth, memo)
+    if plan[0] == 'grid':
+        box_w, box_h = plan[1], plan[2]
+        return ('grid', w//box_w, h//box_h, box_w, box_h)
+    cut = plan[1]
+    if plan[0] == 'v':
+        return ('v', buildNode(cut, h, W, H, depth-1, memo), buildNode(w-cut, h, W, H, depth-1, memo))
+    return ('h', buildNode(w, cut, W, H, depth-1, memo), buildNode(w, h-cut, W, H, depth-1, memo))
+
+def nodeSize(node):
+    ''' Returns (min_width, min_height, gaps_x, gaps_y) of a layout tree. Gaps are the
+        number of spacings between and around boxes, in which extra space is spread '''
+    if node[0] == 'grid':
+        kind, cols, rows, box_w, box_h = node
+        if cols*rows == 0 : return 0, 0, 0, 0
+        return cols*box_w, rows*box_h, cols+1, rows+1
+    w1, h1, gx1, gy1 = nodeSize(node[1])
+    w2, h2, gx2, gy2 = nodeSize(node[2])
+    if node[0] == 'v':
+        return w1+w2, max(h1, h2), gx1+gx2, max(gy1, gy2)
+    return max(w1, w2), h1+h2, max(gx1, gx2), gy1+gy2
+
+def placeNode(node, x, y, w, h, boxes):
+    ''' Append boxes of node placed in the w x h area at (x, y) '''
+    if node[0] == 'grid':
+        kind, cols, rows, box_w, box_h = node
+        if cols*rows == 0 : return
+        spacing_x, spacing_y = (w-cols*box_w)/(cols+1), (h-rows*box_h)/(rows+1)
+        for i in range(cols*rows):
+            row, col = i//cols, i%cols
+            boxes.append((round(x+spacing_x+col*(spacing_x+box_w)), round(y+spacing_y+row*(spacing_y+box_h)),
+                          box_w, box_h))
+        return
+    w1, h1, gx1, gy1 = nodeSize(node[1])
+    w2, h2, gx2, gy2 = nodeSize(node[2])
+    # Spread the extra space between the pieces in proportion to number of gaps in them
+    if node[0] == 'v':
+        first = w1 + (w-w1-w2)*gx1/(gx1+gx2) if gx1+gx2 else w1
+        placeNode(node[1], x, y, first, h, boxes)
+        placeNode(node[2], x+first, y, w-first, h, boxes)
+    else:
+        first = h1 + (h-h1-h2)*gy1/(gy1+gy2) if gy1+gy2 else h1
+        placeNode(node[1], x, y, w, first, boxes)
+        placeNode(node[2], x, y+first, w, h-first, boxes)
+
+def packBoxes(paperW, paperH, sizes, fill_size=None, spacing=0):
+    ''' Returns boxes for photos of different sizes, packed on paper by MaxRects algorithm
+        using best short side fit. sizes is list of (width, height), one for each photo.
+        Larger photos are placed first, photos which do not fit are left out. If fill_size
+        is given, rest of the paper is filled with as many photos of that size as fit.
+        Photos are spacing pixels apart from each other and from paper edges '''
+    paperW, paperH, spacing = int(paperW), int(paperH), int(spacing)
+    # Each box reserves spacing at its right and bottom, and the paper at its top and left
+    free = [(spacing, spacing, paperW-spacing, paperH-spacing)]
+    boxes = []
+    sizes = sorted(((int(w), int(h)) for w, h in sizes), key=lambda size: (-size[0]*size[1], -max(size)))
+    for w, h in sizes:
+        box = placeBox(free, w, h, spacing)
+        if box : boxes.append(box)
+    if fill_size:
+        w, h = int(fill_size[0]), int(fill_size[1])
+        if w > 0 and h > 0:
+            box = placeBox(free, w, h, spacing)
+            while box:
+                boxes.append(box)
+                box = placeBox(free, w, h, spacing)
+    boxes.sort(key=lambda box: (box[1], box[0]))
+    return boxes
+
+def placeBox(free, w, h, spacing):
+    ''' Place w x h box in the free rect where it fits best, and update the list of free
+        rects. Returns the box (x, y, width, height, rotated), or None if it does not fit '''
+    best = None
+    for fx, fy, fw, fh in free:
+        for bw, bh in ((w, h), (h, w)):
+            if bw+spacing > fw or bh+spacing > fh : continue
+            score = (min(fw-bw, fh-bh), max(fw-bw, fh-bh))
+            if best is None or score < best[0]:
+                best = (score, (fx, fy, bw, bh))
+    if best is None : return None
+    x, y, bw, bh = best[1]
+    used = (x, y, bw+spacing, bh+spacing)
+    splitFreeRects(free, used)
+    return (x, y, bw, bh, (bw, bh) != (w, h))
+
+def splitFreeRects(free, used):
+    ''' Replace free rects overlapped by used rect with their parts outside it, and
+        remove the free rects which are inside another '''
+    ux, uy, uw, uh = used
+    new_rects = []
+    for rect in free[:]:
+        fx, fy, fw, fh = rect
+        if ux >= fx+fw or ux+uw <= fx or uy >= fy+fh or uy+uh <= fy : continue
+        free.remove(rect)
+        if ux > fx : new_rects.append((fx, fy, ux-fx, fh))
+        if ux+uw < fx+fw : new_rects.append((ux+uw, fy, fx+fw-ux-uw, fh))
+        if uy > fy : new_rects.append((fx, fy, fw, uy-fy))
+        if uy+uh < fy+fh : new_rects.append((fx, uy+uh, fw, fy+fh-uy-uh))
+    free.extend(new_rects)
+    # Remove rects contained in other rects
+    free[:] = [rect for i, rect in enumerate(free) if not any(
+                j != i and containsRect(other, rect) and (other != rect or j < i)
+                for j, other in enumerate(free))]
+
+def containsRect(outer, inner):
+    return (outer[0] <= inner[0] and outer[1] <= inner[1] and
+            inner[0]+inner[2] <= outer[0]+outer[2] and inner[1]+inner[3] <= outer[1]+outer[3])
@@ -2,12 +2,15 @@
 
 # Form implementation generated from reading ui file 'gridsetup-dialog.ui'
 #
-# Created by: PyQt5 UI code generator 5.7
+# Created by: PyQt5 UI code generator 5.15.11
 #
-# WARNING! All changes made in this file will be lost!
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+
 class Ui_GridSetupDialog(object):
     def setupUi(self, GridSetupDialog):
         GridSetupDialog.setObjectName("GridSetupDialog")
@@ -77,15 +80,21 @@ class Ui_GridSetupDialog(object):
         self.paperSizeUnit.addItem("")
         self.paperSizeUnit.addItem("")
         self.gridLayout.addWidget(self.paperSizeUnit, 0, 4, 1, 1)
+        self.label_7 = QtWidgets.QLabel(GridSetupDialog)
+        self.label_7.setObjectName("label_7")
+        self.gridLayout.addWidget(self.label_7, 3, 0, 1, 1)
+        self.otherSizesEdit = QtWidgets.QLineEdit(GridSetupDialog)
+        self.otherSizesEdit.setObjectName("otherSizesEdit")
+        self.gridLayout.addWidget(self.otherSizesEdit, 3, 1, 1, 4)
         self.buttonBox = QtWidgets.QDialogButtonBox(GridSetupDialog)
         self.buttonBox.setOrientation(QtCore.Qt.Horizontal)
         self.buttonBox.setStandardButtons(QtWidgets.QDialogButtonBox.Cancel|QtWidgets.QDialogButtonBox.Ok)
         self.buttonBox.setObjectName("buttonBox")
-        self.gridLayout.addWidget(self.buttonBox, 3, 0, 1, 5)
+        self.gridLayout.addWidget(self.buttonBox, 4, 0, 1, 5)
 
         self.retranslateUi(GridSetupDialog)
-        self.buttonBox.accepted.connect(GridSetupDialog.accept)
-        self.buttonBox.rejected.connect(GridSetupDialog.reject)
+        self.buttonBox.accepted.connect(GridSetupDialog.accept) # type: ignore
+        self.buttonBox.rejected.connect(GridSetupDialog.reject) # type: ignore
         QtCore.QMetaObject.connectSlotsByName(GridSetupDialog)
 
     def retranslateUi(self, GridSetupDialog):
@@ -100,4 +109,7 @@ class Ui_GridSetupDialog(object):
         self.paperSizeUnit.setItemText(0, _translate("GridSetupDialog", "inch"))
         self.paperSizeUnit.setItemText(1, _translate("GridSetupDialog", "cm"))
         self.paperSizeUnit.setItemText(2, _translate("GridSetupDialog", "mm"))
-
+        self.label_7.setText(_translate("GridSetupDialog", "Other Sizes :"))
+        self.otherSizesEdit.setToolTip(_translate("GridSetupDialog", "Photo sizes in cm with number of copies, to print on the\n"
+"same sheet. Rest of the sheet is filled with Photo Size"))
+        self.otherSizesEdit.setPlaceholderText(_translate("GridSetupDialog", "e.g. 2.5x2.5*4, 10x15*1"))
@@ -0,0 +1,100 @@
+''' Access QImage pixels as NumPy arrays without copying, so that pixel operations
+    can be done as vectorised array kernels. NumPy is optional, check HAVE_NUMPY
+    before using these functions '''
+import sys
+
+from PyQt5 import sip
+from PyQt5.QtGui import QImage
+
+try:
+    import numpy
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+# QImage format -> number of bytes per pixel, for formats which can be viewed directly.
+# For 32 bit formats the channel order in memory is B, G, R, A on little endian machines
+FORMAT_CHANNELS = {
+    QImage.Format_Grayscale8: 1,
+    QImage.Format_RGB888: 3,
+    QImage.Format_RGB32: 4,
+    QImage.Format_ARGB32: 4,
+    QImage.Format_ARGB32_Premultiplied: 4,
+}
+
+if HAVE_NUMPY:
+    class ImageArray(numpy.ndarray):
+        ''' ndarray whose buffer belongs to a QImage. It keeps the QImage alive,
+            as the array is invalid after the QImage is deleted '''
+        def __array_finalize__(self, obj):
+            # Only the array made by imageToArray() refers to the QImage. Views keep it
+            # alive through their base array, and copies or results do not need it
+            self.qimage = None
+
+
+def imageToArray(image):
+    ''' Returns an array of shape (height, width) for grayscale images, and
+        (height, width, channels) for others, which shares pixel memory with image.
+        QPixmap and unsupported formats are converted to QImage Format_ARGB32 first,
+        which is the only case where pixels are copied. Writing to the array modifies
+        the image, so pass a copy if the image must be kept unchanged '''
+    if not isinstance(image, QImage):
+        image = image.toImage()
+    if image.format() not in FORMAT_CHANNELS:
+        image = image.convertToFormat(QImage.Format_ARGB32)
+    channels = FORMAT_CHANNELS[image.format()]
+    width, height, stride = image.width(), image.height(), image.bytesPerLine()
+    ptr = image.bits()      # Detaches image, if its data is shared with other QImage
+    ptr.setsize(image.sizeInBytes())
+    if channels == 1:
+        shape, strides = (height, width), (stride, 1)
+    else:
+        shape, strides = (height, width, channels), (stride, channels, 1)
+    array = numpy.ndarray(shape, numpy.uint8, buffer=ptr, strides=strides).view(ImageArray)
+    array.qimage = image
+    return array
+
+def arrayToImage(array, img_format=None):
+    ''' Returns a QImage using the array as pixel buffer. If the array is a view
+        returned by imageToArray(), its QImage is returned. Otherwise the array must
+        be uint8 and its rows contiguous, else it is copied once. The returned QImage
+        keeps a reference to the array. Default format is guessed from the shape '''
+    qimage = getattr(array, 'qimage', None)
+    if (qimage is not None and img_format in (None, qimage.format())
+            and array.__array_interface__['data'][0] == int(qimage.constBits())
+            and array.shape[:2] == (qimage.height(), qimage.width())
+            and array.strides[0] == qimage.bytesPerLine()
+            and array.ndim == (2 if FORMAT_CHANNELS[qimage.format()] == 1 else 3)
+            and array.shape[2:] == (() if array.ndim == 2 else (FORMAT_CHANNELS[qimage.format()],))):
+        return qimage
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    if img_format is None:
+        img_format = {1: QImage.Format_Grayscale8, 3: QImage.Format_RGB888, 4: QImage.Format_ARGB32}[channels]
+    if array.dtype != numpy.uint8 or array.strides[1:] != ((channels, 1) if array.ndim == 3 else (1,)):
+        array = numpy.ascontiguousarray(array, dtype=numpy.uint8)
+    height, width = array.shape[:2]
+    address = array.__array_interface__['data'][0]
+    image = QImage(sip.voidptr(address), width, height, array.strides[0], img_format)
+    # Keep the buffer alive as long as this QImage object. Implicitly shared copies of
+    # it do not keep the buffer, so use QImage.copy() if it may outlive this object
+    image.array = array
+    return image
+
+def grayscale(image):
+    ''' Returns grayscale Format_Grayscale8 copy of a QImage or QPixmap. Luminance is
+        computed with ITU-R BT.601 weights in one vectorised pass when NumPy is
+        available, else Qt conversion is used '''
+    if not isinstance(image, QImage):
+        image = image.toImage()
+    if not HAVE_NUMPY:
+        return image.convertToFormat(QImage.Format_Grayscale8)
+    if image.format() not in (QImage.Format_RGB32, QImage.Format_ARGB32):
+        image = image.convertToFormat(QImage.Format_RGB32)
+    pixels = imageToArray(image)
+    b, g, r = (0, 1, 2) if sys.byteorder == 'little' else (3, 2, 1)
+    # Weights are 0.299, 0.587, 0.114 in 8 bit fixed point
+    gray = pixels[..., r].astype(numpy.uint16)*77
+    gray += pixels[..., g].astype(numpy.uint16)*150
+    gray += pixels[..., b].astype(numpy.uint16)*29
+    gray >>= 8
+    return arrayToImage(gray.astype(numpy.uint8))
@@ -0,0 +1,241 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QFileInfo, QSize, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QImageIOHandler, QPixmap
+
+from pnm import loadPNM
+
+
+class DecodedImage:
+    ''' A decoded QImage, which may be smaller than the image file.
+        full_size is the size of the full resolution image (after auto transform).
+        buffer is the memory map which image uses as pixel data, if any '''
+    def __init__(self, image, full_size, buffer=None):
+        self.image = image
+        self.full_size = full_size
+        self.buffer = buffer
+
+    def isReduced(self):
+        return self.image.width() < self.full_size.width()
+
+    def sizeInBytes(self):
+        return self.image.sizeInBytes()
+
+
+def getImageSize(image_reader):
+    ''' Returns image size after auto transform without decoding, and whether
+        the image is stored rotated by 90 degree '''
+    size = image_reader.size()
+    rotated = bool(image_reader.transformation() & QImageIOHandler.TransformationRotate90)
+    if rotated : size.transpose()
+    return size, rotated
+
+def decodeImage(filepath, max_size=None):
+    ''' Decode an image file to DecodedImage. Safe to call from worker threads,
+        as it does not touch QPixmap or any widget.
+        If max_size is given, a JPEG larger than that is decoded straight at the size
+        which fits in max_size, which lets libjpeg skip most of the DCT work.
+        Binary PGM/PPM files are memory mapped instead of being read.'''
+    if filepath.lower().endswith(('.ppm', '.pgm', '.pnm')):
+        mapped = loadPNM(filepath)
+        if mapped:
+            image, buffer = mapped
+            if max_size and (image.width() > max_size.width() or image.height() > max_size.height()):
+                preview = image.scaled(max_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                return DecodedImage(preview, image.size())
+            return DecodedImage(image, image.size(), buffer)
+    image_reader = QImageReader(filepath)
+    image_reader.setAutoTransform(True)
+    size, rotated = getImageSize(image_reader)
+    if (max_size and image_reader.format() == 'jpeg' and size.isValid() and
+            (size.width() > max_size.width() or size.height() > max_size.height())):
+        scaled_size = size.scaled(max_size, Qt.KeepAspectRatio)
+        if rotated : scaled_size.transpose()     # scaled size applies before transformation
+        image_reader.setScaledSize(scaled_size)
+    image = image_reader.read()
+    if not size.isValid() : size = image.size()
+    return DecodedImage(image, size)
+
+def decodePixmap(filepath):
+    ''' Decode full resolution image to QPixmap, or QImage if it is memory mapped (see
+        paintableImage()). Must be called from GUI thread '''
+    return paintableImage(decodeImage(filepath))
+
+def paintableImage(decoded):
+    ''' Returns QPixmap of a DecodedImage. A memory mapped image is returned as the
+        QImage itself, which QPainter can draw too, as converting it to QPixmap would
+        read and convert every page of the file. The QImage keeps the map alive.
+        Must be called from GUI thread '''
+    if decoded.buffer is None:
+        return QPixmap.fromImage(decoded.image)
+    image = decoded.image
+    image.buffer = decoded.buffer
+    return image
+
+def cacheKey(filepath):
+    ''' Returns (path, mtime, size) so that a modified file is not served from cache '''
+    fi = QFileInfo(filepath)
+    return (fi.absoluteFilePath(), fi.lastModified().toMSecsSinceEpoch(), fi.size())
+
+
+class ImageCache:
+    ''' LRU cache of DecodedImages, bounded by a memory budget in bytes '''
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        decoded = self.images.get(key)
+        if decoded is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.images.move_to_end(key)
+        return decoded
+
+    def contains(self, key):
+        return key in self.images
+
+    def put(self, key, decoded):
+        if key in self.images:
+            self.used_bytes -= self.images.pop(key).sizeInBytes()
+        if decoded.sizeInBytes() > self.max_bytes : return   # Would evict everything else
+        self.images[key] = decoded
+        self.used_bytes += decoded.sizeInBytes()
+        self.shrink()
+
+    def setMaxBytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.shrink()
+
+    def shrink(self):
+        while self.used_bytes > self.max_bytes:
+            key, decoded = self.images.popitem(last=False)    # Least recently used first
+            self.used_bytes -= decoded.sizeInBytes()
+
+
+class DecodeSignals(QObject):
+    finished = pyqtSignal(int, object, object)
+
+class DecodeTask(QRunnable):
+    ''' Decodes one file in a QThreadPool thread. request_id is 0 for prefetching.
+        A prefetch task is skipped if its batch gets cancelled before it starts.'''
+    def __init__(self, request_id, key, max_size, cancelled=None):
+        QRunnable.__init__(self)
+        self.request_id = request_id
+        self.key = key
+        self.max_size = max_size
+        self.cancelled = cancelled
+        self.signals = DecodeSignals()
+
+    def run(self):
+        if self.cancelled and self.cancelled[0]:
+            decoded = DecodedImage(QImage(), QSize())
+        else:
+            decoded = decodeImage(self.key[0], self.max_size)
+        self.signals.finished.emit(self.request_id, self.key, decoded)
+
+
+class ImageLoader(QObject):
+    ''' Decodes images off the GUI thread. Only the result of the latest request
+        is delivered through imageLoaded, results of older requests are dropped.
+        Decoded images are kept in an ImageCache, which prefetch() fills in advance.
+        Images are decoded to fit in max_size when possible, loadFull() decodes the
+        full resolution image, which is delivered through fullImageLoaded.'''
+    imageLoaded = pyqtSignal(str, DecodedImage)
+    fullImageLoaded = pyqtSignal(str, DecodedImage)
+    def __init__(self, parent, cache_size=200*1024*1024):
+        QObject.__init__(self, parent)
+        self.pool = QThreadPool(self)
+        self.cache = ImageCache(cache_size)
+        self.max_size = None
+        self.request_id = 0
+        self.full_request_id = 0
+        self.loading = False
+        self.full_loading = False
+        self.waiting_key = None     # key of requested file, which is already being decoded
+        self.in_progress = set()    # keys being decoded
+        self.prefetch_cancelled = [False]
+
+    def load(self, filepath):
+        self.request_id += 1
+        self.full_request_id += 1
+        self.full_loading = False
+        key = cacheKey(filepath)
+        self.waiting_key = None
+        decoded = self.cache.get(key)
+        if decoded is not None:
+            self.loading = False
+            self.imageLoaded.emit(key[0], decoded)
+            return
+        self.loading = True
+        if key in self.in_progress:     # Being prefetched, wait for that
+            self.waiting_key = key
+            return
+        self.startTask(self.request_id, key, priority=1)
+
+    def loadFull(self, filepath):
+        ''' Decode full resolution image, which is not cached as it may be huge '''
+        self.full_request_id += 1
+        self.full_loading = True
+        task = DecodeTask(self.full_request_id, cacheKey(filepath), None)
+        task.signals.finished.connect(self.onFullDecoded)
+        self.pool.start(task, 1)
+
+    def prefetch(self, filepaths):
+        ''' Decode the files in background to cache, cancelling previous prefetches '''
+        self.prefetch_cancelled[0] = True
+        self.prefetch_cancelled = [False]
+        for filepath in filepaths:
+            key = cacheKey(filepath)
+            if self.cache.contains(key) or key in self.in_progress : continue
+            self.startTask(0, key, cancelled=self.prefetch_cancelled)
+
+    def startTask(self, request_id, key, priority=0, cancelled=None):
+        self.in_progress.add(key)
+        task = DecodeTask(request_id, key, self.max_size, cancelled)
+        task.signals.finished.connect(self.onDecoded)
+        self.pool.start(task, priority)
+
+    def isLoading(self):
+        return self.loading
+
+    def isLoadingFull(self):
+        return self.full_loading
+
+    def cancel(self):
+        ''' Drop the result of the pending request, if any '''
+        self.request_id += 1
+        self.full_request_id += 1
+        self.loading = False
+        self.full_loading = False
+        self.waiting_key = None
+
+    def shutdown(self):
+        ''' Drop queued decodes and wait for running ones to finish '''
+        self.cancel()
+        self.prefetch_cancelled[0] = True
+        self.pool.clear()
+        self.pool.waitForDone()
+
+    def onDecoded(self, request_id, key, decoded):
+        self.in_progress.discard(key)
+        image = decoded.image
+        if not image.isNull():
+            self.cache.put(key, decoded)
+        if (request_id and request_id == self.request_id) or key == self.waiting_key:
+            self.waiting_key = None
+            if image.isNull() and request_id == 0:   # Prefetch failed or was cancelled, retry
+                self.startTask(self.request_id, key, priority=1)
+                return
+            self.loading = False
+            self.imageLoaded.emit(key[0], decoded)
+        # else it is stale result of an earlier open or a prefetch
+
+    def onFullDecoded(self, request_id, key, decoded):
+        if request_id != self.full_request_id : return
+        self.full_loading = False
+        self.fullImageLoaded.emit(key[0], decoded)
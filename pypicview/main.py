@@ -4,19 +4,31 @@ import sys, os
 sys.path.append(os.path.dirname(__file__)) # A workout for enabling python 2 like import
 from __init__ import __version__
 
-from PyQt5.QtCore import (pyqtSignal, QPoint, Qt, QSettings, QFileInfo, QTimer, QRect, QSize, QEventLoop )
-from PyQt5.QtGui import QIcon, QPainter, QPen, QColor, QPixmap, QImageReader, QMovie, QTransform, QIntValidator
+from PyQt5.QtCore import (pyqtSignal, QPoint, Qt, QSettings, QFileInfo, QTimer, QRect, QSize, QEventLoop,
+        QThreadPool )
+from PyQt5.QtGui import ( QIcon, QRegion, QPainter, QColor, QPixmap, QImage, QImageReader, QMovie,
+        QIntValidator, QKeySequence )
 from PyQt5.QtWidgets import ( QApplication, QMainWindow, QLabel, QHBoxLayout, QSizePolicy, 
-        QDialog, QFileDialog, QInputDialog, QCheckBox, QDoubleSpinBox, QPushButton )
+        QDialog, QFileDialog, QInputDialog, QCheckBox, QDoubleSpinBox, QPushButton,
+        QShortcut )
 
 from mainwindow import Ui_MainWindow
 from resize_dialog import Ui_ResizeDialog
 from photogrid import GridDialog
+from tiles import ( TileCache, ImagePyramid, TileRenderTask, tileRect, visibleTiles, renderTile,
+        drawSourceRect, TILE_SIZE )
+from edits import EditList, SnapshotCache
+from loader import ImageLoader, decodePixmap, paintableImage, getImageSize
+from exif import readExifThumbnail
+from dirindex import DirectoryIndex
 
 
 class Image(QLabel):
-    ''' This is the image widget responsible for displaying image '''
+    ''' This is the image widget responsible for displaying image.
+        Static images are painted tile by tile, and only the tiles visible in the
+        scroll area are rendered. QLabel is only used to play animations.'''
     imageUpdated = pyqtSignal()
+    fullImageNeeded = pyqtSignal()
     def __init__(self, parent, scrollArea):
         QLabel.__init__(self, parent)
         self.vScrollbar = scrollArea.verticalScrollBar()
@@ -27,55 +39,241 @@ class Image(QLabel):
         self.animation = False
         self.crop_mode = False
         self.scale = 1.0
+        self.pic_scale = 1.0
+        self.full_size = QSize()
+        self.full_loader = None
+        self.original = None
+        self.proxy = None
+        self.edits = EditList(QSize())
+        self.snapshots = SnapshotCache()
+        self.tiles = TileCache()
+        self.pyramid = ImagePyramid()
+        self.generation = 0         # Incremented whenever rendered tiles become invalid
+        # While zooming, tiles are painted fast and smoothed in background when zooming stops
+        self.fast_paint = False
+        self.refine_timer = QTimer(self)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.setInterval(150)
+        self.refine_timer.timeout.connect(self.refineTiles)
+        # Mouse moves are handled at most once per display frame
+        self.move_timer = QTimer(self)
+        self.move_timer.setSingleShot(True)
+        self.move_timer.setInterval(max(1, int(1000/(QApplication.primaryScreen().refreshRate() or 60))))
+        self.move_timer.timeout.connect(self.processMouseMove)
+        self.moves_received = 0
+        self.moves_processed = 0
 
     def setAnimation(self, anim):
         self.scale = 1.0
         self.pic = QPixmap()
+        self.pic_scale = 1.0
+        self.full_size = QSize()
+        self.original, self.proxy = None, None
+        self.edits = EditList(QSize())
+        self.tiles.clear()
+        self.pyramid.clear()
         self.setMovie(anim)
         anim.start()
         self.animation = True
 
-    def setImage(self, pixmap):
-        self.pic = pixmap                # Save original pixmap
-        self.showScaled()
+    def setImage(self, pixmap, full_size=None, full_loader=None):
+        ''' pixmap may be a reduced size preview of an image of size full_size.
+            In that case full_loader must return the full resolution pixmap.
+            A memory mapped image is given as QImage, which is painted without
+            converting it to QPixmap, so that only the visible pages are read '''
+        full_size = full_size if full_size else pixmap.size()
+        if pixmap.width() < full_size.width():
+            self.original, self.proxy = None, pixmap
+        else:
+            self.original, self.proxy = pixmap, None    # Save original pixmap
+        self.full_loader = full_loader
+        self.edits = EditList(full_size)
+        self.snapshots.clear()
         self.animation = False
+        self.clear()                     # Remove animation
+        self.renderEdits()
+
+    def setFullImage(self, pixmap):
+        ''' Set full resolution original, when only reduced preview was loaded '''
+        self.original = pixmap
+        self.full_loader = None
+        if self.edits.isEmpty() or isEnlarged(self.displaySize(), self.pic):
+            self.renderEdits()
+
+    def loadOriginal(self):
+        ''' Load full resolution original if only preview is loaded '''
+        if self.original is None and self.full_loader:
+            self.setFullImage(self.full_loader())
+
+    def proxySource(self):
+        ''' Returns reduced original which edits are previewed on. It is the reduced
+            decode, or the original downscaled to fit-to-screen scale at first edit '''
+        if self.proxy is None:
+            if self.scale < 1.0:
+                self.proxy = self.original.scaled(round(self.original.width()*self.scale),
+                        round(self.original.height()*self.scale), Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            else:
+                self.proxy = self.original
+        return self.proxy
+
+    def renderEdits(self):
+        ''' Render edited image for display. Edits are rendered from the proxy,
+            and from full resolution original only when zoomed beyond the proxy.
+            This is the same test as in showScaled(), so that they do not call
+            each other again '''
+        if self.original and (self.edits.isEmpty() or
+                isEnlarged(self.scaledSize(self.scale), self.scaledSize(self.proxyScale()))):
+            source = self.original
+        else:
+            source = self.proxySource()
+        self.pic_scale = source.width()/self.edits.source_size.width()
+        self.pic = self.renderSnapshot(source, self.pic_scale)
+        self.full_size = self.edits.size()
+        self.showScaled()
+
+    def proxyScale(self):
+        return self.proxySource().width()/self.edits.source_size.width()
+
+    def scaledSize(self, scale):
+        ''' Size of the edited image at scale, rounded as render() and displaySize() do '''
+        size = self.edits.size()
+        return QSize(max(1, round(size.width()*scale)), max(1, round(size.height()*scale)))
+
+    def renderSnapshot(self, source, scale):
+        ''' Render edits from source, or reuse the result rendered before undo/redo '''
+        if self.edits.isEmpty() : return source
+        pixmap = self.snapshots.get(self.edits.position, scale)
+        if pixmap is None:
+            pixmap = self.edits.render(source)
+            self.snapshots.put(self.edits.position, scale, pixmap)
+        return pixmap
+
+    def applyEdit(self, op):
+        ''' Record an edit operation (see EditList) and show the result '''
+        self.snapshots.invalidateAfter(self.edits.position)
+        self.edits.append(op)
+        self.renderEdits()
+
+    def undo(self):
+        if self.crop_mode or not self.edits.canUndo() : return
+        self.edits.undo()
+        self.renderEdits()
+
+    def redo(self):
+        if self.crop_mode or not self.edits.canRedo() : return
+        self.edits.redo()
+        self.renderEdits()
+
+    def fullImage(self):
+        ''' Returns edited image at full resolution, all edits are rendered in one pass '''
+        self.loadOriginal()
+        if self.pic_scale == 1.0 : return self.pic
+        return self.renderSnapshot(self.original, 1.0)
 
     def showScaled(self):
-        if self.scale == 1.0:
-            pm = self.pic.copy()
-        else:
-            pm = self.pic.scaledToHeight(self.scale*self.pic.height(), Qt.SmoothTransformation)
-        self.setPixmap(pm)
+        if self.pic_scale < 1.0 and isEnlarged(self.displaySize(), self.pic):
+            if self.original:       # Edited image needs to be rendered at full resolution
+                return self.renderEdits()
+            self.fullImageNeeded.emit()     # Show upscaled preview till full image is loaded
+        self.tiles.clear()
+        self.generation += 1
+        self.updateGeometry()
+        self.update()
         self.imageUpdated.emit()
 
+    def displaySize(self):
+        ''' Size of the image at current scale '''
+        return QSize(max(1, round(self.full_size.width()*self.scale)),
+                     max(1, round(self.full_size.height()*self.scale)))
+
+    def sizeHint(self):
+        if self.animation or self.full_size.isEmpty():
+            return QLabel.sizeHint(self)
+        return self.displaySize()
+
+    def paintEvent(self, ev):
+        if self.animation or self.full_size.isEmpty():
+            return QLabel.paintEvent(self, ev)
+        painter = QPainter(self)
+        self.paintImage(painter, ev.rect())
+        if self.crop_mode:
+            self.paintCropBox(painter, ev.rect())
+
+    def paintImage(self, painter, rect):
+        display_size = self.displaySize()
+        ratio = display_size.width()/self.pic.width()
+        if ratio >= 1.0:
+            # Unscaled or enlarged, the exposed part of the image is drawn straight from pic
+            drawSourceRect(painter, self.pic, rect, display_size)
+            return
+        # Tiles are resampled from the nearest larger pyramid level, not from the full image
+        self.pyramid.setSource(self.pic)
+        source = self.pyramid.levelFor(ratio)
+        for col, row in visibleTiles(rect, display_size):
+            tile = self.tiles.get((col, row))
+            if tile is None and self.fast_paint:
+                drawSourceRect(painter, source, tileRect(col, row, display_size), display_size, False)
+                continue
+            if tile is None:
+                tile = renderTile(source, tileRect(col, row, display_size), display_size)
+                if isinstance(tile, QImage):    # Rendered from mapped image
+                    tile = QPixmap.fromImage(tile)
+                self.tiles.put((col, row), tile)
+            painter.drawPixmap(col*TILE_SIZE, row*TILE_SIZE, tile)
+
     def rotate(self, degree):
-        transform = QTransform()
-        transform.rotate(degree)
-        self.pic = self.pic.transformed(transform)
-        self.showScaled()
+        self.applyEdit(('rotate', degree))
 
     def zoomBy(self, factor):
         self.scale *= factor
+        self.fast_paint = True
+        self.refine_timer.start()
         self.showScaled()
 
+    def refineTiles(self):
+        ''' Render visible tiles smoothly in a worker thread after zooming stops '''
+        display_size = self.displaySize()
+        ratio = display_size.width()/self.pic.width()
+        keys = [key for key in visibleTiles(self.visibleRegion().boundingRect(), display_size)
+                    if self.tiles.get(key) is None]
+        if ratio >= 1.0 or keys == []:
+            self.fast_paint = False
+            self.update()
+            return
+        self.pyramid.setSource(self.pic)
+        source = self.pyramid.levelFor(ratio)
+        if not isinstance(source, QImage):
+            # toImage() of a raster pixmap shares its data, so this does not copy the pixels
+            source = source.toImage()
+        task = TileRenderTask(self.generation, source, keys, display_size)
+        task.signals.finished.connect(self.onTilesRendered)
+        QThreadPool.globalInstance().start(task)
+
+    def onTilesRendered(self, generation, tiles):
+        if generation != self.generation : return     # Zoomed again meanwhile
+        for key, tile in tiles:
+            self.tiles.put(key, QPixmap.fromImage(tile))
+        self.fast_paint = False
+        self.update()
+
     def enableCropMode(self, enable):
         if enable:
             self.crop_mode = True
             # scaleW, scaleH give better accuracy while cropping downscaled image
-            self.scaleW = self.pixmap().width()/self.pic.width()
-            self.scaleH = self.pixmap().height()/self.pic.height()
-            self.pm_tmp = self.pixmap().copy()
+            display_size = self.displaySize()
+            self.scaleW = display_size.width()/self.full_size.width()
+            self.scaleH = display_size.height()/self.full_size.height()
             self.topleft = QPoint(0,0)
-            self.btmright = QPoint(self.pixmap().width()-1, self.pixmap().height()-1)
+            self.btmright = QPoint(display_size.width()-1, display_size.height()-1)
             self.last_pt = QPoint(self.btmright)
             self.p1, self.p2 = QPoint(self.topleft), QPoint(self.btmright)
             self.crop_width, self.crop_height = 3.5, 4.5
             self.lock_crop_ratio = False
-            self.imgAspect = self.pic.width()/self.pic.height()
+            self.imgAspect = self.full_size.width()/self.full_size.height()
+            self.drawn_box = None
             self.drawCropBox()
         else:
             self.crop_mode = False
-            del self.pm_tmp
             self.showScaled()
 
     def mousePressEvent(self, ev):
@@ -97,20 +295,35 @@ class Image(QLabel):
             self.clk_area = 0
 
     def mouseReleaseEvent(self, ev):
+        if self.move_timer.isActive():     # Apply the last move before releasing
+            self.move_timer.stop()
+            self.processMouseMove()
         self.mouse_pressed = False
         if not self.crop_mode: return
         self.topleft, self.btmright = self.p1, self.p2
         #print(self.p1.x(), self.p1.y(), self.p2.x()/self.scale, self.p2.y()/self.scale)
 
     def mouseMoveEvent(self, ev):
+        ''' Move events are coalesced, only the latest position is handled once per frame '''
         if not self.mouse_pressed : return
+        self.moves_received += 1
+        self.move_pos, self.move_global = ev.pos(), ev.globalPos()
+        if not self.move_timer.isActive():
+            self.move_timer.start()
+
+    def moveEventStats(self):
+        ''' Returns no. of processed and dropped mouse move events, for tuning '''
+        return self.moves_processed, self.moves_received - self.moves_processed
+
+    def processMouseMove(self):
+        self.moves_processed += 1
         if not self.crop_mode:
             # Handle click and drag to scroll
-            self.vScrollbar.setValue(self.v_scrollbar_pos + self.clk_global.y() - ev.globalY())
-            self.hScrollbar.setValue(self.h_scrollbar_pos + self.clk_global.x() - ev.globalX())
+            self.vScrollbar.setValue(self.v_scrollbar_pos + self.clk_global.y() - self.move_global.y())
+            self.hScrollbar.setValue(self.h_scrollbar_pos + self.clk_global.x() - self.move_global.x())
             return
         # Handle crop mode
-        moved = ev.pos() - self.clk_pos
+        moved = self.move_pos - self.clk_pos
         boxAspect = self.crop_width/self.crop_height
 
         if self.clk_area == 1: # Top left corner is clicked
@@ -137,21 +350,35 @@ class Image(QLabel):
 
         self.drawCropBox()
 
+    def cropBoxRect(self):
+        return QRect(self.p1.x(), self.p1.y(), self.p2.x()-self.p1.x(), self.p2.y()-self.p1.y())
+
     def drawCropBox(self):
-        pm = self.pm_tmp.copy()
-        pm_box = pm.copy(self.p1.x(), self.p1.y(), self.p2.x()-self.p1.x(), self.p2.y()-self.p1.y())
-        painter = QPainter(pm)
-        painter.fillRect(0,0, pm.width(), pm.height(), QColor(127,127,127,127))
-        painter.drawPixmap(self.p1.x(), self.p1.y(), pm_box)
-        painter.drawRect(self.p1.x(), self.p1.y(), self.p2.x()-self.p1.x(), self.p2.y()-self.p1.y())
+        ''' Repaint only the area where the crop box was or is now. The overlay is drawn
+            over the image in paintCropBox() '''
+        # Corner handles stick out of a box smaller than them, or an inverted box
+        box = self.cropBoxRect().normalized().united(QRect(self.p1, QSize(60, 60))).united(
+                    QRect(self.p2, QSize(-60, -60)).normalized())
+        box = box.adjusted(-1, -1, 2, 2)     # Include the border lines
+        if self.drawn_box is None:
+            self.update()
+        else:
+            self.update(box.united(self.drawn_box))
+        self.drawn_box = box
+        self.imageUpdated.emit()
+
+    def paintCropBox(self, painter, rect):
+        box = self.cropBoxRect()
+        painter.setClipRegion(QRegion(rect).subtracted(QRegion(box)))
+        painter.fillRect(rect, QColor(127,127,127,127))     # Shade the area outside crop box
+        painter.setClipping(False)
+        painter.setPen(Qt.black)
+        painter.drawRect(box)
         painter.drawRect(self.p1.x(), self.p1.y(), 59, 59)
         painter.drawRect(self.p2.x(), self.p2.y(), -59, -59)
         painter.setPen(Qt.white)
         painter.drawRect(self.p1.x()+1, self.p1.y()+1, 57, 57)
         painter.drawRect(self.p2.x()-1, self.p2.y()-1, -57, -57)
-        painter.end()
-        self.setPixmap(pm)
-        self.imageUpdated.emit()
 
     def lockCropRatio(self, checked):
         self.lock_crop_ratio = bool(checked)
@@ -164,8 +391,8 @@ class Image(QLabel):
 
     def cropImage(self):
         w, h = round((self.btmright.x()-self.topleft.x()+1)/self.scaleW), round((self.btmright.y()-self.topleft.y()+1)/self.scaleH)
-        pm = self.pic.copy(round(self.topleft.x()/self.scaleW), round(self.topleft.y()/self.scaleH), w, h)
-        self.setImage(pm)
+        rect = QRect(round(self.topleft.x()/self.scaleW), round(self.topleft.y()/self.scaleH), w, h)
+        self.applyEdit(('crop', rect.intersected(QRect(QPoint(0, 0), self.full_size))))
 
 
 class Window(QMainWindow, Ui_MainWindow):
@@ -189,6 +416,14 @@ class Window(QMainWindow, Ui_MainWindow):
         self.offset_y = int(self.settings.value("OffsetY", 26))
         self.btnboxwidth = int(self.settings.value("BtnBoxWidth", 60))
         self.crop_widgets = []
+        self.loader = ImageLoader(self, int(self.settings.value("CacheSize", 200))*1024*1024)
+        self.prefetch_count = int(self.settings.value("PrefetchCount", 2))
+        self.image.snapshots.setMaxBytes(int(self.settings.value("UndoCacheSize", 100))*1024*1024)
+        self.direction = 1      # Direction of travel in folder, 1 for next, -1 for previous
+        self.dir_index = DirectoryIndex(self, ['.jpg', '.jpeg', '.png', '.gif', '.svg', '.bmp', '.tiff', '.ppm', '.pgm'])
+        self.loader.imageLoaded.connect(self.onImageLoaded)
+        self.loader.fullImageLoaded.connect(self.onFullImageLoaded)
+        self.loader.max_size = self.getMaxImageSize()
 
     def connectSignals(self):
         # For the buttons of the left side
@@ -210,6 +445,7 @@ class Window(QMainWindow, Ui_MainWindow):
         self.slideShowBtn.clicked.connect(self.playSlideShow)
         # Connect other signals
         self.image.imageUpdated.connect(self.updateStatus)
+        self.image.fullImageNeeded.connect(self.loadFullImage)
         # Connect Shortcuts
         self.openBtn.setShortcut('Ctrl+O')
         self.saveBtn.setShortcut('Ctrl+S')
@@ -226,31 +462,71 @@ class Window(QMainWindow, Ui_MainWindow):
         self.rotateLeftBtn.setShortcut('Ctrl+Left')
         self.rotateRightBtn.setShortcut('Ctrl+Right')
         self.slideShowBtn.setShortcut('Space')
+        QShortcut(QKeySequence.Undo, self, self.image.undo)
+        QShortcut(QKeySequence.Redo, self, self.image.redo)
 
     def openFile(self, filepath=False):
         if not filepath :
-            filefilter = "Image files (*.jpg *.png *.jpeg *.svg *.gif *.tiff *.ppm *.bmp);;JPEG Images (*.jpg *.jpeg);;PNG Images (*.png);;SVG Images (*.svg);;All Files (*)"
+            filefilter = "Image files (*.jpg *.png *.jpeg *.svg *.gif *.tiff *.ppm *.pgm *.bmp);;JPEG Images (*.jpg *.jpeg);;PNG Images (*.png);;SVG Images (*.svg);;All Files (*)"
             filepath, sel_filter = QFileDialog.getOpenFileName(self, 'Open Image', self.filepath, filefilter)            
             if filepath == '' : return
         image_reader = QImageReader(filepath)
         if image_reader.format() == 'gif': # For gif animations
+            self.loader.cancel()
             anim = QMovie(filepath)
             self.image.setAnimation(anim)
             self.adjustWindowSize(True)
             self.statusbar.showMessage("Resolution : %ix%i" % (self.image.width(), self.image.height()))
             self.disableButtons(True)
-        else:                         # For static images
-          image_reader.setAutoTransform(True)
-          pm = QPixmap.fromImageReader(image_reader)
-          if not pm.isNull() :
-            self.image.scale = self.getOptimumScale(pm)
-            self.image.setImage(pm)
-            self.adjustWindowSize()
-            self.disableButtons(False)
-          else:
+            self.filepath = filepath
+            self.setWindowTitle(QFileInfo(filepath).fileName())
+        else:                         # For static images, decoded in background
+            # filepath and title are set in onImageLoaded(), only if decoding succeeds
+            self.statusbar.showMessage("Loading %s ..." % QFileInfo(filepath).fileName())
+            self.loader.load(filepath)
+            if self.loader.isLoading():
+                self.showThumbnail(image_reader, filepath)
+
+    def showThumbnail(self, image_reader, filepath):
+        ''' Show upscaled EXIF thumbnail till the image is decoded '''
+        thumbnail = readExifThumbnail(filepath)
+        if thumbnail is None : return
+        full_size, rotated = getImageSize(image_reader)
+        if not full_size.isValid() : return
+        self.image.scale = self.getOptimumScale(full_size)
+        full_loader = lambda : decodePixmap(filepath)
+        self.image.setImage(QPixmap.fromImage(thumbnail), full_size, full_loader)
+        self.adjustWindowSize()
+        self.disableButtons(True)
+        self.statusbar.showMessage("Loading %s ..." % QFileInfo(filepath).fileName())
+
+    def onImageLoaded(self, filepath, decoded):
+        ''' Called in GUI thread when background decoding of a static image finishes '''
+        if decoded.image.isNull():
+            self.statusbar.showMessage("Failed to open %s" % QFileInfo(filepath).fileName())
             return
         self.filepath = filepath
         self.setWindowTitle(QFileInfo(filepath).fileName())
+        pm = paintableImage(decoded)
+        self.image.scale = self.getOptimumScale(decoded.full_size)
+        full_loader = None
+        if decoded.isReduced():     # Full resolution image is decoded only when required
+            full_loader = lambda : decodePixmap(filepath)
+        self.image.setImage(pm, decoded.full_size, full_loader)
+        self.adjustWindowSize()
+        self.disableButtons(False)
+        # Decode next few images in direction of travel, so that they open instantly
+        neighbours = self.getNeighbourFiles(self.prefetch_count, self.direction)
+        self.loader.prefetch([path for path in neighbours if not path.lower().endswith('.gif')])
+
+    def loadFullImage(self):
+        ''' Decode full resolution image in background, when zoomed beyond the preview '''
+        if self.image.full_loader and not (self.loader.isLoading() or self.loader.isLoadingFull()):
+            self.loader.loadFull(self.filepath)
+
+    def onFullImageLoaded(self, filepath, decoded):
+        if decoded.image.isNull() or self.image.original is not None: return
+        self.image.setFullImage(paintableImage(decoded))
 
     def saveFile(self):
         quality = -1
@@ -263,23 +539,46 @@ class Window(QMainWindow, Ui_MainWindow):
             if self.image.animation:
                 pm = self.image.movie().currentPixmap()
             else:
-                pm = self.image.pic
+                pm = self.fullImage()
             if not pm.isNull():
                 pm.save(filepath, None, quality)
 
+    def fullImage(self):
+        ''' Returns edited image at full resolution. If the original is not decoded yet,
+            it is decoded in GUI thread with a busy cursor, or the running background
+            decode is waited for '''
+        if self.image.original is not None or not self.image.full_loader:
+            return self.image.fullImage()
+        if self.slideShowBtn.isChecked():     # Must not open next image while waiting
+            self.slideShowBtn.setChecked(False)
+            self.playSlideShow(False)
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        self.statusbar.showMessage("Loading full resolution image ...")
+        loop = QEventLoop()
+        # Polled, as the decode may also end by being cancelled, without fullImageLoaded
+        while self.loader.isLoadingFull():
+            QTimer.singleShot(20, loop.quit)
+            loop.exec_(QEventLoop.ExcludeUserInputEvents)
+        pm = self.image.fullImage()     # Decodes here only if background decode failed
+        QApplication.restoreOverrideCursor()
+        self.updateStatus()
+        return pm
+
     def resizeImage(self):
-        dialog = ResizeDialog(self, self.image.pic.width(), self.image.pic.height())
+        full_width, full_height = self.image.full_size.width(), self.image.full_size.height()
+        dialog = ResizeDialog(self, full_width, full_height)
         if dialog.exec_() == 1 :
             img_width, img_height = dialog.widthEdit.text(), dialog.heightEdit.text()
             if img_width!='' and img_height!='' :
-                pm = self.image.pic.scaled(int(img_width), int(img_height), Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+                size = QSize(int(img_width), int(img_height))
             elif img_width!='' :
-                pm = self.image.pic.scaledToWidth(int(img_width), Qt.SmoothTransformation)
+                size = QSize(int(img_width), round(full_height*int(img_width)/full_width))
             elif img_height!='' :
-                pm = self.image.pic.scaledToHeight(int(img_height), Qt.SmoothTransformation)
+                size = QSize(round(full_width*int(img_height)/full_height), int(img_height))
             else :
                 return
-            self.image.setImage(pm)
+            if size.isEmpty() : return
+            self.image.applyEdit(('resize', size))
 
 
     def cropImage(self):
@@ -333,45 +632,45 @@ class Window(QMainWindow, Ui_MainWindow):
     def addBorder(self):
         width, ok = QInputDialog.getInt(self, 'Add Border', 'Enter Border Width :', 2, 1)
         if ok:
-            painter = QPainter(self.image.pic)
-            pen = QPen(Qt.black)
-            pen.setWidth(width)
-            pen.setJoinStyle(Qt.MiterJoin);
-            painter.setPen(pen)
-            painter.drawRect(width/2, width/2, self.image.pic.width()-width, self.image.pic.height()-width)
-            self.image.showScaled()
+            self.image.applyEdit(('border', width))
 
     def createPhotoGrid(self):
-        dialog = GridDialog(self.image.pic, self)
+        pm = self.fullImage()
+        if isinstance(pm, QImage):      # Memory mapped image
+            pm = QPixmap.fromImage(pm)
+        dialog = GridDialog(pm, self)
         if dialog.exec_() == 1:
+            if dialog.gridPaper.photo_grid is None:     # Large grid is saved to file
+                self.statusbar.showMessage("Photo grid saved to %s" % dialog.gridPaper.grid_filepath)
+                return
             self.image.scale = self.getOptimumScale(dialog.gridPaper.photo_grid)
             self.image.setImage(dialog.gridPaper.photo_grid)
             self.adjustWindowSize()
 
-    def openPrevImage(self):
+    def getNeighbourFiles(self, count, direction):
+        ''' Returns paths of next (direction=1) or previous (direction=-1) images '''
         fi = QFileInfo(self.filepath)
-        if not fi.exists() : return
-        filename = fi.fileName()
+        if not fi.exists() : return []
         basedir = fi.absolutePath()         # This does not include filename
-        file_filter = ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.svg", "*.bmp", "*.tiff"]
-        image_list = fi.dir().entryList(file_filter)
+        self.dir_index.setDirectory(basedir)
+        neighbours = []
+        for i in range(1, min(count, self.dir_index.count()-1)+1):
+            filename = self.dir_index.neighbour(fi.fileName(), i*direction)
+            if filename is None : break
+            neighbours.append(basedir + '/' + filename)
+        return neighbours
 
-        index = image_list.index(filename)
-        prevfile = image_list[index-1]
-        self.openFile(basedir + '/' + prevfile)
+    def openPrevImage(self):
+        self.direction = -1
+        prevfiles = self.getNeighbourFiles(1, -1)
+        if prevfiles == [] : return
+        self.openFile(prevfiles[0])
 
     def openNextImage(self):
-        fi = QFileInfo(self.filepath)
-        if not fi.exists() : return
-        filename = fi.fileName()
-        basedir = fi.absolutePath()         # This does not include filename
-        file_filter = ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.svg", "*.bmp", "*.tiff"]
-        image_list = fi.dir().entryList(file_filter)
-
-        index = image_list.index(filename)
-        if index == len(image_list)-1 : index = -1
-        nextfile = image_list[index+1]
-        self.openFile(basedir + '/' + nextfile)
+        self.direction = 1
+        nextfiles = self.getNeighbourFiles(1, 1)
+        if nextfiles == [] : return
+        self.openFile(nextfiles[0])
 
     def zoomInImage(self):
         self.image.zoomBy(6.0/5)
@@ -380,6 +679,7 @@ class Window(QMainWindow, Ui_MainWindow):
         self.image.zoomBy(5.0/6)
 
     def origSizeImage(self):
+        # Upscaled preview is shown till full resolution image is decoded in background
         self.image.scale = 1.0
         self.image.showScaled()
 
@@ -400,11 +700,18 @@ class Window(QMainWindow, Ui_MainWindow):
             self.timer.stop()
             self.slideShowBtn.setIcon(QIcon(':/play.png'))
 
-    def getOptimumScale(self, pixmap):
-        img_width = pixmap.width()
-        img_height = pixmap.height()
+    def getMaxImageSize(self):
+        ''' Returns the largest image size which fits on screen without scrolling '''
         max_width = self.screen_width - (2*self.btnboxwidth + 2*self.offset_x)
         max_height = self.screen_height - (self.offset_y + self.offset_x + 4+32) # 32 for statusbar with buttons
+        return QSize(max_width, max_height)
+
+    def getOptimumScale(self, size):
+        ''' size is QSize or QPixmap of the image '''
+        img_width = size.width()
+        img_height = size.height()
+        max_size = self.getMaxImageSize()
+        max_width, max_height = max_size.width(), max_size.height()
         if img_width > max_width or img_height > max_height :
             if (max_width/max_height > img_width/img_height) :
                 scale = max_height/img_height
@@ -421,8 +728,8 @@ class Window(QMainWindow, Ui_MainWindow):
             self.resize(self.image.width() + 2*self.btnboxwidth + 4, 
                     self.image.height() + 4+32)
         else:
-            self.resize(self.image.pixmap().width() + 2*self.btnboxwidth + 4, 
-                    self.image.pixmap().height() + 4+32)
+            self.resize(self.image.displaySize().width() + 2*self.btnboxwidth + 4, 
+                    self.image.displaySize().height() + 4+32)
         self.move((self.screen_width - (self.width() + 2*self.offset_x) )/2+self.offset_x, 
                   (self.screen_height - (self.height() + self.offset_x + self.offset_y))/2+self.offset_y )
 
@@ -431,8 +738,8 @@ class Window(QMainWindow, Ui_MainWindow):
             width = round((self.image.p2.x() - self.image.p1.x() + 1)/self.image.scaleW)
             height = round((self.image.p2.y() - self.image.p1.y() + 1)/self.image.scaleH)
         else:
-            width = self.image.pic.width()
-            height = self.image.pic.height()
+            width = self.image.full_size.width()
+            height = self.image.full_size.height()
         text = "Resolution : %ix%i , Scale : %3.2fx" % (width, height, self.image.scale)
         self.statusbar.showMessage(text)
 
@@ -448,6 +755,7 @@ class Window(QMainWindow, Ui_MainWindow):
         self.rotateRightBtn.setDisabled(disable)
 
     def closeEvent(self, ev):
+        self.loader.shutdown()
         self.settings.setValue('OffsetX', self.geometry().x()-self.x())
         self.settings.setValue('OffsetY', self.geometry().y()-self.y())
         self.settings.setValue('BtnBoxWidth', self.frame.width())
@@ -481,6 +789,11 @@ class ResizeDialog(QDialog, Ui_ResizeDialog):
         self.widthEdit.setText( str(round(DPI * self.spinWidth.value()/2.54)))
         self.heightEdit.setText( str(round(DPI * self.spinHeight.value()/2.54)))
         
+def isEnlarged(size, pixmap):
+    ''' True if pixmap shown at size is enlarged by more than the one pixel which
+        rounding and truncation of scaled sizes cause '''
+    return size.width() > pixmap.width()+1 or size.height() > pixmap.height()+1
+
 def wait(millisec):
     loop = QEventLoop()
     QTimer.singleShot(millisec, loop.quit)
@@ -1,12 +1,28 @@
 from photogrid_dialog import Ui_GridDialog
 from gridsetup_dialog import Ui_GridSetupDialog
-from PyQt5.QtCore import Qt, QObject, pyqtSignal, QRect, QPoint, QSettings
-from PyQt5.QtGui import QPixmap, QPainter, QImageReader, QPen
-from PyQt5.QtWidgets import QApplication, QLabel, QDialog, QHBoxLayout, QSizePolicy, QFileDialog, QMessageBox
+import os, shutil, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from PyQt5.QtCore import ( Qt, QObject, QRunnable, QThreadPool, pyqtSignal, QRect, QSize, QSizeF,
+        QMarginsF, QSettings )
+from PyQt5.QtGui import QPixmap, QImage, QPainter, QPen, QPdfWriter, QPageSize, QPageLayout
+from PyQt5.QtWidgets import ( QApplication, QLabel, QDialog, QHBoxLayout, QSizePolicy, QFileDialog,
+        QMessageBox, QInputDialog )
+from imagearray import grayscale
+from loader import decodeImage
+from pngwriter import PNGWriter
+from gridlayout import guillotineLayout, packBoxes
+
+PREVIEW_SIZE = 512  # Max width and height of the photo kept in memory for preview
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.ppm', '.pgm')
+MAX_GRID_PIXELS = 64*1024*1024    # Larger grids are saved to file in strips instead of created in memory
+STRIP_BYTES = 32*1024*1024
+MAX_PREVIEW_SIDE = 4096    # Grid preview of a larger sheet is shown at lower than screen DPI
 
 helptext = '''Click on a image thumbnail to select an image to drop. Then click on the blank boxes to drop the selected photo.
 
-If you want to create grid with more different photos then load photo by clicking Add Photo button.
+If you want to create grid with more different photos then load photos by clicking Add Photo button, or drop image files or folders on this window.
 
 You can change the photo of a box by selecting another image and clicking over the box.'''
 
@@ -20,79 +36,227 @@ class GridDialog(QDialog, Ui_GridDialog):
         self.gridPaper = GridPaper(self)
         layout.addWidget(self.gridPaper)
         self.thumbnailGr = ThumbnailGroup(self)
-        thumbnail = Thumbnail(pixmap, self.frame)
+        thumbnail = Thumbnail(PhotoSource(pixmap=pixmap), self.frame)
         self.verticalLayout.addWidget(thumbnail)
-        thumbnail.select(True)
         thumbnail.clicked.connect(self.gridPaper.setPhoto)
         self.thumbnailGr.append(thumbnail)
+        self.thumbnailGr.setSelected(thumbnail)
         self.configureBtn.clicked.connect(self.configure)
         self.addPhotoBtn.clicked.connect(self.addPhoto)
         self.checkAddBorder.clicked.connect(self.gridPaper.toggleBorder)
+        self.checkGrayscale.clicked.connect(self.gridPaper.setGrayscale)
+        self.savePdfBtn.clicked.connect(self.savePdf)
+        self.saveCopiesBtn.clicked.connect(self.saveCopies)
         self.helpBtn.clicked.connect(self.showHelp)
-        self.gridPaper.photo = pixmap
+        self.gridPaper.photo = thumbnail.photo
+        self.pool = QThreadPool(self)
+        self.setAcceptDrops(True)
 
     def configure(self):
         dialog = GridSetupDialog(self)
         if dialog.exec_()==1:
             self.gridPaper.paperW = dialog.paperW
             self.gridPaper.paperH = dialog.paperH
-            self.gridPaper.rows = dialog.rows
-            self.gridPaper.cols = dialog.cols
             self.gridPaper.W = dialog.W
             self.gridPaper.H = dialog.H
             self.gridPaper.DPI = dialog.DPI
+            self.gridPaper.other_sizes = dialog.other_sizes
             self.gridPaper.setupGrid()
 
     def addPhoto(self):
         filefilter = "JPEG Images (*.jpg *jpeg);;PNG Images (*.png);;All Files (*)"
-        filepath, sel_filter = QFileDialog.getOpenFileName(self, 'Open Image', '', filefilter)            
-        if filepath == '' : return
-        image_reader = QImageReader(filepath)
-        image_reader.setAutoTransform(True)
-        pm = QPixmap.fromImageReader(image_reader)
-        if not pm.isNull() :
-            thumbnail = Thumbnail(pm, self.frame)
-            self.verticalLayout.addWidget(thumbnail)
-            thumbnail.clicked.connect(self.gridPaper.setPhoto)
-            self.thumbnailGr.append(thumbnail)
+        filepaths, sel_filter = QFileDialog.getOpenFileNames(self, 'Open Images', '', filefilter)
+        self.loadPhotos(filepaths)
+
+    def loadPhotos(self, filepaths):
+        ''' Decode previews in thread pool. Thumbnails are added as decodes finish '''
+        for filepath in filepaths:
+            task = PreviewTask(filepath)
+            task.signals.finished.connect(self.onPreviewDecoded)
+            self.pool.start(task)
+
+    def onPreviewDecoded(self, filepath, image):
+        if image.isNull() : return
+        thumbnail = Thumbnail(PhotoSource(filepath, preview=QPixmap.fromImage(image)), self.frame)
+        self.verticalLayout.addWidget(thumbnail)
+        thumbnail.clicked.connect(self.gridPaper.setPhoto)
+        self.thumbnailGr.append(thumbnail)
+
+    def dragEnterEvent(self, ev):
+        if ev.mimeData().hasUrls():
+            ev.acceptProposedAction()
+
+    def dropEvent(self, ev):
+        filepaths = []
+        for url in ev.mimeData().urls():
+            path = url.toLocalFile()
+            if os.path.isdir(path):
+                filepaths += sorted(os.path.join(path, name) for name in os.listdir(path)
+                                    if name.lower().endswith(IMAGE_EXTENSIONS))
+            elif path:
+                filepaths.append(path)
+        self.loadPhotos(filepaths)
+        ev.acceptProposedAction()
 
     def accept(self):
         # Create final grid when ok is clicked
-        self.gridPaper.createFinalGrid()
+        if self.gridPaper.isLarge():
+            filepath, sel_filter = QFileDialog.getSaveFileName(self, 'Save Photo Grid', 'photogrid.png',
+                                                               'PNG Image (*.png)')
+            if filepath == '' : return
+            self.gridPaper.saveFinalGrid(filepath)
+        else:
+            self.gridPaper.createFinalGrid()
         QDialog.accept(self)
 
+    def savePdf(self):
+        filepath, sel_filter = QFileDialog.getSaveFileName(self, 'Save Photo Grid', 'photogrid.pdf',
+                                                           'PDF Document (*.pdf)')
+        if filepath == '' : return
+        self.gridPaper.savePdf(filepath)
+
+    def saveCopies(self):
+        ''' Print given number of copies of each added photo, on as many sheets as needed '''
+        items = self.askCopies()
+        if not items : return
+        filefilter = "PDF Document (*.pdf);;PNG Images (*.png);;JPEG Images (*.jpg)"
+        filepath, sel_filter = QFileDialog.getSaveFileName(self, 'Save Photo Grids', 'photogrid.pdf', filefilter)
+        if filepath == '' : return
+        job = self.gridPaper.createJob()
+        for photo, copies in items:
+            job.add(photo, copies)
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        if filepath.lower().endswith('.pdf'):
+            job.savePdf(filepath)
+        else:
+            job.saveImages(filepath)
+        QApplication.restoreOverrideCursor()
+
+    def askCopies(self):
+        ''' Ask number of copies of each photo, while its thumbnail is shown selected.
+            Default is the number of boxes it fills on current sheet, or 1 if none.
+            Returns list of (photo, copies), or None if cancelled '''
+        placed = list(self.gridPaper.photo_dict.values())
+        selected = self.thumbnailGr.selected
+        items = []
+        for thumbnail in self.thumbnailGr.thumbnails:
+            photo = thumbnail.photo
+            self.thumbnailGr.setSelected(thumbnail)
+            name = os.path.basename(photo.filepath) if photo.filepath else 'the opened photo'
+            copies, ok = QInputDialog.getInt(self, 'Print Copies', 'Copies of %s :' % name,
+                                             placed.count(photo) or 1, 0, 100000)
+            if not ok:
+                items = None
+                break
+            if copies > 0:
+                items.append((photo, copies))
+        self.thumbnailGr.setSelected(selected)
+        return items
+
+    def done(self, result):
+        self.pool.clear()       # Drop queued preview decodes
+        self.pool.waitForDone()
+        QDialog.done(self, result)
+
     def showHelp(self):
         global helptext
         QMessageBox.about(self, 'How to Create Grid', helptext)
 
+class PhotoSource:
+    ''' A photo added to the grid. Photos added from files are kept as file path and a
+        small preview, and are decoded at print size only when the final grid is created.
+        The image opened in viewer is kept as pixmap, as it may have been edited '''
+    def __init__(self, filepath='', pixmap=None, preview=None):
+        self.filepath = filepath
+        self.pixmap = pixmap
+        if preview is not None:
+            self.preview = preview
+        elif pixmap is None:
+            self.preview = QPixmap.fromImage(decodePreview(filepath))
+        else:
+            self.preview = fitImage(pixmap, PREVIEW_SIZE, PREVIEW_SIZE)
+
+    def isNull(self):
+        return self.preview.isNull()
+
+    def loadScaled(self, width, height):
+        ''' Returns the photo as QImage scaled to fit in width x height, decoded from
+            file at that size, so that only one photo is in memory at a time '''
+        if self.pixmap is not None:
+            return self.pixmap.toImage().scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        return decodeScaled(self.filepath, width, height)
+
+def decodeScaled(filepath, width, height):
+    ''' Decode image file to QImage which fits in width x height. Does not use QPixmap,
+        so it can be used in worker threads and processes '''
+    decoded = decodeImage(filepath, QSize(width, height))
+    image = decoded.image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    if decoded.buffer is not None and image.size() == decoded.image.size():
+        image = image.copy()    # Memory mapped file is closed with decoded
+    return image
+
+def decodePreview(filepath):
+    ''' Returns QImage of size at most PREVIEW_SIZE. Safe to call from worker threads.
+        JPEGs are decoded straight at the reduced size using QImageReader.setScaledSize '''
+    decoded = decodeImage(filepath, QSize(PREVIEW_SIZE, PREVIEW_SIZE))
+    image = fitImage(decoded.image, PREVIEW_SIZE, PREVIEW_SIZE)
+    if decoded.buffer is not None:
+        image = image.copy()    # Memory mapped file is closed with decoded
+    return image
+
+def fitImage(image, width, height):
+    ''' Scale down QImage or QPixmap to fit in width x height, if it is larger '''
+    if image.width() <= width and image.height() <= height : return image
+    return image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+
+class PreviewSignals(QObject):
+    finished = pyqtSignal(str, object)
+
+class PreviewTask(QRunnable):
+    ''' Decodes preview of a photo in a QThreadPool thread '''
+    def __init__(self, filepath):
+        QRunnable.__init__(self)
+        self.filepath = filepath
+        self.signals = PreviewSignals()
+
+    def run(self):
+        self.signals.finished.emit(self.filepath, decodePreview(self.filepath))
+
+
 class Thumbnail(QLabel):
-    clicked = pyqtSignal(QPixmap)
-    def __init__(self, pixmap, parent):
+    clicked = pyqtSignal(object)
+    def __init__(self, photo, parent):
         QLabel.__init__(self, parent)
         self.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
-        self.photo = pixmap
-        self.setPixmap(pixmap.scaledToWidth(100))
+        self.photo = photo      # PhotoSource
+        self.base_pm = photo.preview.scaledToWidth(100)   # Scaled once and reused on every select
+        self.selected_pm = None
+        self.setPixmap(self.base_pm)
         
     def mousePressEvent(self, ev):
         self.clicked.emit(self.photo)
 
     def select(self, select):
         if select:
-            pm = self.photo.scaledToWidth(100)
-            painter = QPainter(pm)
-            pen = QPen(Qt.blue)
-            pen.setWidth(4)
-            painter.setPen(pen)
-            painter.drawRect(2, 2 , 100-4, pm.height()-4)
-            painter.end()
-            self.setPixmap(pm)
+            if self.selected_pm is None:
+                pm = QPixmap(self.base_pm)
+                painter = QPainter(pm)
+                pen = QPen(Qt.blue)
+                pen.setWidth(4)
+                painter.setPen(pen)
+                painter.drawRect(2, 2 , 100-4, pm.height()-4)
+                painter.end()
+                self.selected_pm = pm
+            self.setPixmap(self.selected_pm)
         else:
-            self.setPixmap(self.photo.scaledToWidth(100))
+            self.setPixmap(self.base_pm)
 
 class ThumbnailGroup(QObject):
     def __init__(self, parent):
         QObject.__init__(self, parent)
         self.thumbnails = []
+        self.selected = None
 
     def append(self, thumbnail):
         self.thumbnails.append(thumbnail)
@@ -100,62 +264,107 @@ class ThumbnailGroup(QObject):
 
     def selectThumbnail(self):
         ''' This can only be used as slot connect to Thumbnail obj'''
-        for thumbnail in self.thumbnails:
-            thumbnail.select(False)
-        self.sender().select(True)
+        self.setSelected(self.sender())
+
+    def setSelected(self, thumbnail):
+        ''' Select thumbnail and unselect only the previously selected one '''
+        if thumbnail is self.selected : return
+        if self.selected is not None:
+            self.selected.select(False)
+        thumbnail.select(True)
+        self.selected = thumbnail
 
 class GridPaper(QLabel):
     def __init__(self, parent):
         QLabel.__init__(self, parent)
         self.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
         self.setMouseTracking(True)
-        self.pixmap_dict = {}
+        self.photo_dict = {}    # box index -> PhotoSource
+        self.photo_grid = None
+        self.grid_filepath = ''
         self.add_border = True
+        self.grayscale = False
+        self.gray_cache = {}    # PhotoSource -> grayscale preview
+        self.scaled_cache = {}  # (PhotoSource, grayscale, width, height, mode) -> scaled preview
         settings = QSettings(self)
         self.DPI = int(settings.value("DPI", 300))
         self.paperW = float(settings.value("PaperWidth", 1800))
         self.paperH = float(settings.value("PaperHeight", 1200))
         self.W = float(settings.value("ImageWidth", 413))
         self.H = float(settings.value("ImageHeight", 531))
-        self.paperW, self.paperH, self.rows, self.cols = getRowsCols(self.paperW, self.paperH, self.W, self.H)           # total no. of columns and rows
+        self.other_sizes = parseSizes(settings.value("OtherSizes", ""), self.DPI)
         self.setupGrid()
 
     def setupGrid(self):
         self.boxes = []         # The rectangles which determines where to place image
-        self.spacingX, self.spacingY = (self.paperW-self.cols*self.W)/(self.cols+1), (self.paperH-self.rows*self.H)/(self.rows+1)
+        self.scaled_cache = {}  # Photo size has changed
+        # Boxes at print resolution, some of them may be rotated to fit more photos
+        if self.other_sizes:
+            sizes = [(w, h) for w, h, count in self.other_sizes for i in range(count)]
+            self.cells = packBoxes(self.paperW, self.paperH, sizes, (self.W, self.H), self.DPI/25.4) # 1 mm spacing
+        else:
+            self.cells = guillotineLayout(self.paperW, self.paperH, self.W, self.H)
+        for index in [index for index in self.photo_dict if index >= len(self.cells)]:
+            del self.photo_dict[index]
         # Setup Foreground Grid
         screenDPI = QApplication.desktop().logicalDpiX()
-        self.scale = screenDPI/self.DPI
-        w, h = self.W*self.scale, self.H*self.scale
-        spacing_x, spacing_y = self.spacingX*self.scale, self.spacingY*self.scale
-        for i in range(self.cols*self.rows):
-            row, col = i//self.cols, i%self.cols        # Position of the box as row & col
-            box = QRect(spacing_x+col*(spacing_x+w), spacing_y+row*(spacing_y+h), w-1, h-1)
-            #print(spacingX+col*(spacingX+w), spacingY+row*(spacingY+h), w, h)
+        self.scale = min(screenDPI/self.DPI, MAX_PREVIEW_SIDE/max(self.paperW, self.paperH))
+        for x, y, w, h, rotated in self.cells:
+            box = QRect(round(x*self.scale), round(y*self.scale),
+                        max(1, int(w*self.scale)-1), max(1, int(h*self.scale)-1))
             self.boxes.append(box)
-        fg = QPixmap(self.paperW*self.scale, self.paperH*self.scale)
+        fg = QPixmap(int(self.paperW*self.scale), int(self.paperH*self.scale))
         fg.fill()
         painter = QPainter(fg)
         for box in self.boxes:
             painter.drawRect(box)
         painter.end()
         self.setPixmap(fg)
+        self.drawPhotos()
 
-    def setPhoto(self, pixmap):
-        self.photo = pixmap
+    def setPhoto(self, photo):
+        self.photo = photo
 
     def toggleBorder(self, ok):
         self.add_border = ok
+        self.drawPhotos()
+
+    def setGrayscale(self, ok):
+        self.grayscale = ok
+        self.drawPhotos()
+
+    def drawPhotos(self):
+        ''' Draw all placed photos again, after border or grayscale option is changed '''
         grid = self.pixmap()
         painter = QPainter(grid)
-        for index in self.pixmap_dict:
-            topleft = self.boxes[index].topLeft()
-            pm = self.pixmap_dict[index].scaled(self.W*self.scale, self.H*self.scale, 1, 1)
-            painter.drawPixmap(topleft, pm)
-            if ok: painter.drawRect(topleft.x(), topleft.y(), pm.width()-1, pm.height()-1)
+        for index in self.photo_dict:
+            self.drawPreviewPhoto(painter, index, self.photo_dict[index])
         painter.end()
         self.setPixmap(grid)
 
+    def drawPreviewPhoto(self, painter, index, photo):
+        box = self.boxes[index]
+        rotated = self.cells[index][4]
+        w, h = box.width()+1, box.height()+1
+        pm = self.scaledPhoto(photo, h, w) if rotated else self.scaledPhoto(photo, w, h)
+        drawPhotoInBox(painter, pm, (box.x(), box.y(), w, h, rotated), self.add_border)
+
+    def photoFor(self, photo):
+        ''' Returns the preview of photo as it is to be printed. Each distinct photo is
+            converted to grayscale only once, however many boxes it is placed in '''
+        if not self.grayscale : return photo.preview
+        if photo not in self.gray_cache:
+            self.gray_cache[photo] = QPixmap.fromImage(grayscale(photo.preview))
+        return self.gray_cache[photo]
+
+    def scaledPhoto(self, photo, width, height, mode=Qt.SmoothTransformation):
+        ''' Returns the preview of photo scaled to fit in width x height. It is scaled
+            once for each size, instead of once for each box it is placed in '''
+        key = (photo, self.grayscale, width, height, mode)
+        if key not in self.scaled_cache:
+            self.scaled_cache[key] = self.photoFor(photo).scaled(width, height, Qt.KeepAspectRatio, mode)
+        return self.scaled_cache[key]
+
     def mouseMoveEvent(self, ev):
         # Change cursor whenever cursor comes over a box
         for box in self.boxes:
@@ -165,42 +374,222 @@ class GridPaper(QLabel):
         self.setCursor(Qt.ArrowCursor)
 
     def mousePressEvent(self, ev):
-        blank_pm = QPixmap(self.W*self.scale, self.H*self.scale)
-        blank_pm.fill()
-        for box in self.boxes:
+        for index, box in enumerate(self.boxes):
             if box.contains(ev.pos()):
-                topleft = box.topLeft()
-                #print(topleft.x(), topleft.y())
-                pm = self.photo.scaled(self.W*self.scale, self.H*self.scale, 1, 1)
                 bg = self.pixmap()
                 painter = QPainter(bg)
-                painter.drawPixmap(topleft, blank_pm) # Erase older image by placing blank image over it
-                painter.drawPixmap(topleft, pm)
-                if self.add_border:
-                    painter.drawRect(topleft.x(), topleft.y(), pm.width()-1, pm.height()-1)
+                # Erase older image by filling the box with white
+                painter.fillRect(box.x(), box.y(), box.width()+1, box.height()+1, Qt.white)
+                self.drawPreviewPhoto(painter, index, self.photo)
                 painter.end()
                 self.setPixmap(bg)
-                self.pixmap_dict[self.boxes.index(box)] = self.photo
+                self.photo_dict[index] = self.photo
                 break
 
+    def finalBox(self, index):
+        ''' Returns the rect of a box in the final grid '''
+        return QRect(*self.cells[index][:4])
+
+    def printPhoto(self, photo, size):
+        ''' Returns photo decoded at print size (width, height), as QImage '''
+        return printImage(photo.loadScaled(*size), self.grayscale)
+
+    def photosToPrint(self):
+        ''' Returns dict of (photo, size) -> list of indexes of the boxes it is placed in '''
+        boxes_of_photo = {}
+        for index, photo in self.photo_dict.items():
+            boxes_of_photo.setdefault((photo, photoSize(self.cells[index])), []).append(index)
+        return boxes_of_photo
+
+    def drawFinalPhoto(self, painter, index, img):
+        drawPhotoInBox(painter, img, self.cells[index], self.add_border)
+
+    def createJob(self):
+        ''' Returns a GridJob with the boxes and options of this grid '''
+        return GridJob((int(self.paperW), int(self.paperH)), self.cells, self.DPI, self.add_border, self.grayscale)
+
+    def isLarge(self):
+        ''' Returns True if final grid is too large to be created in memory '''
+        return self.paperW*self.paperH > MAX_GRID_PIXELS
+
     def createFinalGrid(self):
-        self.photo_grid = QPixmap(self.paperW, self.paperH)
+        self.photo_grid = QPixmap(int(self.paperW), int(self.paperH))
         self.photo_grid.fill()
         painter = QPainter(self.photo_grid)
-        for index in self.pixmap_dict:
-            row, col = index//self.cols, index%self.cols
-            topleft = QPoint(self.spacingX+col*(self.spacingX+self.W), self.spacingY+row*(self.spacingY+self.H))
-            pm = self.pixmap_dict[index].scaled(self.W, self.H, 1, 1)
-            painter.drawPixmap(topleft, pm)
-            if self.add_border:
-                painter.drawRect(topleft.x(), topleft.y(), pm.width()-1, pm.height()-1)
+        # Decode one photo at a time at print size, and place it in all of its boxes
+        for (photo, size), indexes in self.photosToPrint().items():
+            img = self.printPhoto(photo, size)
+            for index in indexes:
+                self.drawFinalPhoto(painter, index, img)
+            del img
         painter.end()
 
+    def savePdf(self, filepath):
+        ''' Save final grid as PDF page of paper size. Each distinct photo is decoded at
+            print size and drawn in all its boxes. Qt embeds an image once and reuses it
+            for each box, as long as the same QImage is drawn. Borders are vector lines '''
+        writer = QPdfWriter(filepath)
+        writer.setResolution(self.DPI)
+        writer.setPageSize(QPageSize(QSizeF(self.paperW/self.DPI, self.paperH/self.DPI), QPageSize.Inch))
+        writer.setPageMargins(QMarginsF(0, 0, 0, 0))
+        writer.setPageOrientation(QPageLayout.Portrait)
+        painter = QPainter(writer)
+        for (photo, size), indexes in self.photosToPrint().items():
+            img = self.printPhoto(photo, size)
+            for index in indexes:
+                self.drawFinalPhoto(painter, index, img)
+            del img
+        painter.end()
+
+    def saveFinalGrid(self, filepath):
+        ''' Render final grid in horizontal strips and write them to a PNG file one by
+            one. A photo is decoded when the first strip crossing its boxes is rendered,
+            and is dropped after the last one, so memory used does not grow with sheet size '''
+        width, height = int(self.paperW), int(self.paperH)
+        strip_height = max(1, min(height, STRIP_BYTES//(width*3)))
+        bottom_of_photo = {}    # (photo, size) -> bottom of its lowest box
+        for key, indexes in self.photosToPrint().items():
+            bottom_of_photo[key] = max(self.finalBox(index).bottom() for index in indexes)
+        loaded = {}
+        writer = PNGWriter(filepath, width, height)
+        for y in range(0, height, strip_height):
+            strip = QImage(width, min(strip_height, height-y), QImage.Format_RGB888)
+            strip.fill(Qt.white)
+            painter = QPainter(strip)
+            painter.translate(0, -y)
+            for index, photo in self.photo_dict.items():
+                box = self.finalBox(index)
+                if box.bottom() < y or box.top() >= y+strip.height() : continue
+                key = (photo, photoSize(self.cells[index]))
+                if key not in loaded:
+                    loaded[key] = self.printPhoto(*key)
+                self.drawFinalPhoto(painter, index, loaded[key])
+            painter.end()
+            writer.writeStrip(strip)
+            for key in [key for key in loaded if bottom_of_photo[key] < y+strip.height()]:
+                del loaded[key]
+        writer.close()
+        self.photo_grid = None
+        self.grid_filepath = filepath
+
+
+class GridJob:
+    ''' Prints a number of copies of each photo, on as many sheets as needed. Every
+        sheet has the same boxes, which are (x, y, width, height, rotated) at print
+        resolution, as returned by guillotineLayout().
+        Sheets are rendered in parallel processes and saved as numbered image files,
+        or are saved as pages of one PDF '''
+    def __init__(self, paper_size, boxes, DPI=300, add_border=True, grayscale=False):
+        self.paper_size = paper_size    # (width, height) in pixels
+        self.boxes = boxes
+        self.DPI = DPI
+        self.add_border = add_border
+        self.grayscale = grayscale
+        self.items = []     # (PhotoSource, copies)
+
+    def add(self, photo, copies):
+        self.items.append((photo, copies))
+
+    def sheets(self):
+        ''' Returns list of sheets, each sheet is list of photos for its boxes '''
+        photos = [photo for photo, copies in self.items for i in range(copies)]
+        count = len(self.boxes)
+        if count == 0 : return []
+        return [photos[i:i+count] for i in range(0, len(photos), count)]
+
+    def saveImages(self, filepath, max_workers=None):
+        ''' Save sheets as filepath with page number added to its name, e.g. grid-1.png.
+            Returns list of saved files '''
+        base, ext = os.path.splitext(filepath)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            # Worker processes need files. Photos without file are saved to temporary files
+            paths = {}
+            for photo, copies in self.items:
+                if photo in paths : continue
+                if photo.filepath:
+                    paths[photo] = photo.filepath
+                else:
+                    paths[photo] = os.path.join(tmp_dir, '%i.png' % len(paths))
+                    photo.pixmap.save(paths[photo])
+            tasks = [([paths[photo] for photo in sheet], self.paper_size, self.boxes, self.add_border,
+                      self.grayscale, '%s-%i%s' % (base, i+1, ext)) for i, sheet in enumerate(self.sheets())]
+            # spawn, as forking a process which runs Qt GUI is unsafe
+            with ProcessPoolExecutor(max_workers, mp_context=get_context('spawn')) as executor:
+                return list(executor.map(saveSheet, tasks))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def savePdf(self, filepath):
+        ''' Save sheets as pages of a PDF. A PDF is written by one QPdfWriter, so pages
+            are rendered one by one here. Each photo is decoded once for all pages '''
+        writer = QPdfWriter(filepath)
+        writer.setResolution(self.DPI)
+        writer.setPageSize(QPageSize(QSizeF(self.paper_size[0]/self.DPI, self.paper_size[1]/self.DPI), QPageSize.Inch))
+        writer.setPageMargins(QMarginsF(0, 0, 0, 0))
+        writer.setPageOrientation(QPageLayout.Portrait)
+        painter = QPainter(writer)
+        images = {}
+        for page, sheet in enumerate(self.sheets()):
+            if page > 0:
+                writer.newPage()
+            for box, photo in zip(self.boxes, sheet):
+                size = photoSize(box)
+                if (photo, size) not in images:
+                    images[(photo, size)] = printImage(photo.loadScaled(*size), self.grayscale)
+                drawPhotoInBox(painter, images[(photo, size)], box, self.add_border)
+        painter.end()
+
+def printImage(image, gray):
+    return grayscale(image) if gray else image
+
+def photoSize(box):
+    ''' Returns (width, height) of photo before rotating it to place in box '''
+    x, y, w, h, rotated = box
+    return (h, w) if rotated else (w, h)
+
+def drawPhotoInBox(painter, image, box, add_border):
+    ''' Draw QImage or QPixmap at top left of box, rotated by 90 degree if the box is '''
+    x, y, w, h, rotated = box
+    painter.save()
+    painter.translate(x, y)
+    if rotated:
+        painter.translate(image.height(), 0)
+        painter.rotate(90)
+    if isinstance(image, QImage):
+        painter.drawImage(0, 0, image)
+    else:
+        painter.drawPixmap(0, 0, image)
+    if add_border:
+        painter.drawRect(0, 0, image.width()-1, image.height()-1)
+    painter.restore()
+
+def renderSheet(filepaths, paper_size, boxes, add_border, gray):
+    ''' Returns sheet as QImage with the photo files placed in boxes '''
+    sheet = QImage(paper_size[0], paper_size[1], QImage.Format_RGB32)
+    sheet.fill(Qt.white)
+    painter = QPainter(sheet)
+    images = {}
+    for box, filepath in zip(boxes, filepaths):
+        size = photoSize(box)
+        if (filepath, size) not in images:
+            images[(filepath, size)] = printImage(decodeScaled(filepath, *size), gray)
+        drawPhotoInBox(painter, images[(filepath, size)], box, add_border)
+    painter.end()
+    return sheet
+
+def saveSheet(args):
+    ''' Render a sheet and save it to file. Runs in worker process '''
+    filepaths, paper_size, boxes, add_border, gray, filepath = args
+    renderSheet(filepaths, paper_size, boxes, add_border, gray).save(filepath)
+    return filepath
+
 
 class GridSetupDialog(QDialog, Ui_GridSetupDialog):
     def __init__(self, parent):
         QDialog.__init__(self, parent)
         self.setupUi(self)
+        self.otherSizesEdit.setText(QSettings(self).value("OtherSizes", ""))
 
     def accept(self):
         units = [1, 1/2.54, 1/25.4]
@@ -209,11 +598,13 @@ class GridSetupDialog(QDialog, Ui_GridSetupDialog):
         paperW = self.spinPaperWidth.value()*unit_mult*DPI
         paperH = self.spinPaperHeight.value()*unit_mult*DPI
         W, H = self.spinPhotoWidth.value()*DPI/2.54, self.spinPhotoHeight.value()*DPI/2.54
-        self.paperW, self.paperH, self.rows, self.cols = getRowsCols(paperW, paperH, W, H)
+        self.paperW, self.paperH = paperW, paperH
         self.W = W
         self.H = H
         self.DPI = DPI
+        self.other_sizes = parseSizes(self.otherSizesEdit.text(), DPI)
         settings = QSettings(self)
+        settings.setValue("OtherSizes", self.otherSizesEdit.text())
         settings.setValue("DPI", self.DPI)
         settings.setValue("PaperWidth", self.paperW)
         settings.setValue("PaperHeight", self.paperH)
@@ -221,11 +612,17 @@ class GridSetupDialog(QDialog, Ui_GridSetupDialog):
         settings.setValue("ImageHeight", self.H)
         QDialog.accept(self)
 
-def getRowsCols(paperW, paperH, W, H):
-    ''' Input : int paper_width, int paper_height, int image_width, int image_height
-        Rerurns paper width, paper height, rows, cols'''
-    rows1, cols1 = int(paperH//H), int(paperW//W)
-    rows2, cols2 = int(paperW//H), int(paperH//W)
-    if rows1*cols1 >= rows2*cols2:
-        return paperW, paperH, rows1, cols1
-    return paperH, paperW, rows2, cols2
+def parseSizes(text, DPI):
+    ''' Parse sizes like "2.5x2.5*4, 10x15" (in cm, *4 is number of copies) and return
+        list of (width, height, count) in pixels. Invalid entries are ignored '''
+    sizes = []
+    for item in text.replace(' ', '').split(','):
+        size, sep, count = item.partition('*')
+        try:
+            w, h = [float(val)*DPI/2.54 for val in size.lower().split('x')]
+            count = int(count) if count else 1
+        except ValueError:
+            continue
+        if w >= 1 and h >= 1 and count > 0:
+            sizes.append((w, h, count))
+    return sizes
@@ -2,12 +2,15 @@
 
 # Form implementation generated from reading ui file 'photogrid-dialog.ui'
 #
-# Created by: PyQt5 UI code generator 5.7
+# Created by: PyQt5 UI code generator 5.15.11
 #
-# WARNING! All changes made in this file will be lost!
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+
 class Ui_GridDialog(object):
     def setupUi(self, GridDialog):
         GridDialog.setObjectName("GridDialog")
@@ -53,10 +56,19 @@ class Ui_GridDialog(object):
         self.scrollAreaWidgetContents.setObjectName("scrollAreaWidgetContents")
         self.scrollArea.setWidget(self.scrollAreaWidgetContents)
         self.gridLayout.addWidget(self.scrollArea, 0, 1, 1, 3)
+        self.checkGrayscale = QtWidgets.QCheckBox(GridDialog)
+        self.checkGrayscale.setObjectName("checkGrayscale")
+        self.gridLayout.addWidget(self.checkGrayscale, 3, 2, 1, 1)
+        self.savePdfBtn = QtWidgets.QPushButton(GridDialog)
+        self.savePdfBtn.setObjectName("savePdfBtn")
+        self.gridLayout.addWidget(self.savePdfBtn, 3, 3, 1, 1)
+        self.saveCopiesBtn = QtWidgets.QPushButton(GridDialog)
+        self.saveCopiesBtn.setObjectName("saveCopiesBtn")
+        self.gridLayout.addWidget(self.saveCopiesBtn, 3, 1, 1, 1)
 
         self.retranslateUi(GridDialog)
-        self.buttonBox.accepted.connect(GridDialog.accept)
-        self.buttonBox.rejected.connect(GridDialog.reject)
+        self.buttonBox.accepted.connect(GridDialog.accept) # type: ignore
+        self.buttonBox.rejected.connect(GridDialog.reject) # type: ignore
         QtCore.QMetaObject.connectSlotsByName(GridDialog)
 
     def retranslateUi(self, GridDialog):
@@ -66,4 +78,6 @@ class Ui_GridDialog(object):
         self.checkAddBorder.setText(_translate("GridDialog", "Add Border"))
         self.helpBtn.setText(_translate("GridDialog", "Help"))
         self.configureBtn.setText(_translate("GridDialog", "Configure"))
-
+        self.checkGrayscale.setText(_translate("GridDialog", "Grayscale"))
+        self.savePdfBtn.setText(_translate("GridDialog", "Save PDF"))
+        self.saveCopiesBtn.setText(_translate("GridDialog", "Print Copies"))
@@ -0,0 +1,44 @@
+import struct
+import zlib
+
+from PyQt5.QtGui import QImage
+
+
+class PNGWriter:
+    ''' Writes an RGB PNG file strip by strip, so that an image much larger than
+        memory can be saved. Each strip is compressed and written to disk as soon
+        as it is given, only the zlib stream state is kept between strips '''
+    def __init__(self, filepath, width, height):
+        self.width, self.height = width, height
+        self.rows_written = 0
+        self.file = open(filepath, 'wb')
+        self.compressor = zlib.compressobj(6)
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        # 8 bit depth, color type 2 (RGB), no interlace
+        self.writeChunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def writeChunk(self, chunk_type, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+    def writeStrip(self, image):
+        ''' Append the rows of image, which must be as wide as the PNG '''
+        if image.format() != QImage.Format_RGB888:
+            image = image.convertToFormat(QImage.Format_RGB888)
+        stride, row_bytes = image.bytesPerLine(), self.width*3
+        ptr = image.constBits()
+        ptr.setsize(image.sizeInBytes())
+        data = ptr.asstring()
+        rows = b''.join(b'\x00' + data[y*stride : y*stride+row_bytes]  # filter type None
+                        for y in range(image.height()))
+        compressed = self.compressor.compress(rows)
+        if compressed:
+            self.writeChunk(b'IDAT', compressed)
+        self.rows_written += image.height()
+
+    def close(self):
+        self.writeChunk(b'IDAT', self.compressor.flush())
+        self.writeChunk(b'IEND', b'')
+        self.file.close()
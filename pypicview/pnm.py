@@ -0,0 +1,50 @@
+import mmap
+
+from PyQt5 import sip
+from PyQt5.QtGui import QImage
+
+
+def parseHeader(data):
+    ''' Returns (magic, width, height, maxval, data_offset) of binary PNM header,
+        or None if data does not start with a P5 or P6 header '''
+    magic = bytes(data[:2])
+    if magic not in (b'P5', b'P6') : return None
+    pos, values = 2, []
+    while len(values) < 3:
+        # Skip whitespace and comments
+        while pos < len(data) and data[pos] in b' \t\r\n#':
+            if data[pos] == ord('#'):
+                pos = data.find(b'\n', pos)
+                if pos == -1 : return None
+            pos += 1
+        start = pos
+        while pos < len(data) and 48 <= data[pos] <= 57: # digits
+            pos += 1
+        if pos == start : return None
+        values.append(int(data[start:pos]))
+    return (magic,) + tuple(values) + (pos+1,)   # Single whitespace after maxval
+
+def loadPNM(filepath):
+    ''' Map a binary 8 bit PGM (P5) or PPM (P6) file into memory and return (QImage, mmap),
+        where the QImage uses the mapped file as pixel buffer, without copying or parsing
+        pixels. The mapping is copy-on-write, so pages are read only when accessed, and are
+        copied only if written. The mmap must be kept alive as long as the QImage is used.
+        Returns None for other files, so that they can be read by QImageReader '''
+    try:
+        with open(filepath, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    except (OSError, ValueError):   # ValueError for empty file
+        return None
+    header = parseHeader(mm[:1024])
+    if header is None:
+        mm.close()
+        return None
+    magic, width, height, maxval, offset = header
+    channels = 3 if magic == b'P6' else 1
+    if maxval != 255 or width < 1 or height < 1 or len(mm) < offset + width*height*channels:
+        mm.close()      # 16 bit or truncated file
+        return None
+    address = int(sip.voidptr(mm)) + offset
+    img_format = QImage.Format_RGB888 if channels == 3 else QImage.Format_Grayscale8
+    image = QImage(sip.voidptr(address), width, height, width*channels, img_format)
+    return image, mm
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, QPoint, QRect, QRectF, pyqtSignal
+from PyQt5.QtGui import QPixmap, QImage, QPainter
+
+TILE_SIZE = 256
+
+
+class TileCache:
+    ''' LRU cache of rendered tiles of the current zoom level, bounded by memory
+        budget in bytes. Tiles are keyed by (col, row) '''
+    def __init__(self, max_bytes=64*1024*1024):
+        self.max_bytes = max_bytes
+        self.tiles = OrderedDict()
+        self.used_bytes = 0
+
+    def get(self, key):
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+        return tile
+
+    def put(self, key, tile):
+        if key in self.tiles:
+            self.used_bytes -= tileBytes(self.tiles.pop(key))
+        self.tiles[key] = tile
+        self.used_bytes += tileBytes(tile)
+        while self.used_bytes > self.max_bytes and len(self.tiles) > 1:
+            key, tile = self.tiles.popitem(last=False)
+            self.used_bytes -= tileBytes(tile)
+
+    def clear(self):
+        self.tiles.clear()
+        self.used_bytes = 0
+
+def tileBytes(tile):
+    return tile.width()*tile.height()*4
+
+
+class ImagePyramid:
+    ''' Mipmap pyramid of a pixmap. Level n is the source downscaled by 2^n, and is
+        built lazily from level n-1 when first needed '''
+    def __init__(self):
+        self.levels = []
+
+    def setSource(self, pixmap):
+        if self.levels and self.levels[0].cacheKey() == pixmap.cacheKey() : return
+        self.levels = [pixmap]
+
+    def clear(self):
+        self.levels = []
+
+    def level(self, n):
+        while len(self.levels) <= n:
+            prev = self.levels[-1]
+            if prev.width() < 2 or prev.height() < 2 : return prev
+            self.levels.append(prev.scaled(prev.width()//2, prev.height()//2,
+                                           Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+        return self.levels[n]
+
+    def levelFor(self, ratio):
+        ''' Returns the smallest level which is not smaller than source scaled by ratio '''
+        n = 0
+        while ratio <= 0.5**(n+1) : n += 1
+        return self.level(n)
+
+
+def tileRect(col, row, display_size):
+    ''' Returns the rect of a tile in display coordinates, clipped to image '''
+    return QRect(col*TILE_SIZE, row*TILE_SIZE, TILE_SIZE, TILE_SIZE).intersected(
+                QRect(0, 0, display_size.width(), display_size.height()))
+
+def visibleTiles(rect, display_size):
+    ''' Returns (col, row) of tiles intersecting rect in display coordinates '''
+    rect = rect.intersected(QRect(0, 0, display_size.width(), display_size.height()))
+    if rect.isEmpty() : return []
+    return [(col, row) for row in range(rect.top()//TILE_SIZE, rect.bottom()//TILE_SIZE + 1)
+                       for col in range(rect.left()//TILE_SIZE, rect.right()//TILE_SIZE + 1)]
+
+def renderTile(source, rect, display_size, transform_mode=Qt.SmoothTransformation):
+    ''' Render the part of source pixmap which is shown at rect when the whole source
+        is scaled to display_size. Only the needed source pixels are scaled.
+        If source is a QImage, the tile is a QImage too, so it can be used in threads '''
+    ratio_x = display_size.width()/source.width()
+    ratio_y = display_size.height()/source.height()
+    src_rect = QRectF(rect.x()/ratio_x, rect.y()/ratio_y, rect.width()/ratio_x, rect.height()/ratio_y)
+    src_rect = src_rect.toAlignedRect().intersected(source.rect())
+    piece = source.copy(src_rect).scaled(max(1, round(src_rect.width()*ratio_x)),
+                                         max(1, round(src_rect.height()*ratio_y)),
+                                         Qt.IgnoreAspectRatio, transform_mode)
+    if isinstance(source, QImage):
+        tile = QImage(rect.size(), QImage.Format_ARGB32_Premultiplied)
+    else:
+        tile = QPixmap(rect.size())
+    tile.fill(Qt.transparent)
+    painter = QPainter(tile)
+    pos = QPoint(round(src_rect.x()*ratio_x) - rect.x(), round(src_rect.y()*ratio_y) - rect.y())
+    if isinstance(piece, QImage):
+        painter.drawImage(pos, piece)
+    else:
+        painter.drawPixmap(pos, piece)
+    painter.end()
+    return tile
+
+def drawSourceRect(painter, source, rect, display_size, smooth=None):
+    ''' Draw the part of source (QPixmap or QImage) at rect, when the whole source is
+        scaled to display_size, without creating any intermediate pixmap. Used when
+        source is not downscaled, as bilinear filtering by painter is good enough for
+        enlarging. Also used with smooth=False to paint quickly while zooming '''
+    rect = rect.intersected(QRect(0, 0, display_size.width(), display_size.height()))
+    ratio_x = display_size.width()/source.width()
+    ratio_y = display_size.height()/source.height()
+    src_rect = QRectF(rect.x()/ratio_x, rect.y()/ratio_y, rect.width()/ratio_x, rect.height()/ratio_y)
+    if smooth is None:
+        smooth = ratio_x > 1.0 or ratio_y > 1.0
+    painter.setRenderHint(QPainter.SmoothPixmapTransform, smooth)
+    if isinstance(source, QImage):
+        painter.drawImage(QRectF(rect), source, src_rect)
+    else:
+        painter.drawPixmap(QRectF(rect), source, src_rect)
+
+
+class TileSignals(QObject):
+    finished = pyqtSignal(int, object)
+
+class TileRenderTask(QRunnable):
+    ''' Smoothly renders tiles from a QImage in a QThreadPool thread.
+        Emits the generation it was started for, and list of ((col, row), QImage) '''
+    def __init__(self, generation, source, keys, display_size):
+        QRunnable.__init__(self)
+        self.generation = generation
+        self.source = source
+        self.keys = keys
+        self.display_size = display_size
+        self.signals = TileSignals()
+
+    def run(self):
+        tiles = []
+        for col, row in self.keys:
+            rect = tileRect(col, row, self.display_size)
+            tiles.append(((col, row), renderTile(self.source, rect, self.display_size)))
+        self.signals.finished.emit(self.generation, tiles)